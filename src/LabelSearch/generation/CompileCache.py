@@ -0,0 +1,195 @@
+# Gregory Gay (greg@greggay.com)
+# On-disk cache of compiler output.
+# Maps a hash of the source text, the compiler flags, and the contents of the files the source
+# includes or links against to the executable (or object file) and messages that the compiler produced.
+# Identical sources are then compiled once, no matter how many times they are evaluated.
+# Entries are directories named by their key, so several processes can share a cache directory.
+# Least-recently used entries are evicted once the cache reaches its maximum size.
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from subprocess import Popen, PIPE
+
+class CompileCache():
+
+    # Directory holding the cached entries
+    directory = ""
+    # Cached entries, ordered from least to most recently used
+    __entries = None
+    # Hashes of the files that sources depend on, by (path, modification time, size)
+    __fileHashes = None
+    # Guards the entries and counts, as compilations may run on several threads
+    __lock = None
+    # Maximum number of cached compilations
+    maxSize = 500
+    # Number of compilations answered from the cache
+    hits = 0
+    # Number of compilations that ran the compiler
+    misses = 0
+    # Number of entries evicted to stay within the maximum size
+    evictions = 0
+    # Lines dropped from sources before hashing.
+    # The score file name is always passed to suite executables, so suites that only differ in their name share an entry.
+    ignorePatterns = [re.compile(r"^char\* fileName = .*$", re.MULTILINE)]
+    # Quoted includes, whose contents are part of the key
+    includePattern = re.compile(r"^\s*#include\s+\"([^\"]+)\"", re.MULTILINE)
+
+    def __init__(self, directory = "", maxSize = 500):
+        if directory == "":
+            directory = os.path.join("/dev/shm" if os.access("/dev/shm", os.W_OK) else tempfile.gettempdir(), "labelsearch_compile_cache")
+        self.directory = directory
+        self.maxSize = maxSize
+        self.__fileHashes = {}
+        self.__lock = threading.Lock()
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # Another process created it first
+                pass
+        self.loadEntries()
+
+    # Read the entries already on disk, ordered by last use
+    def loadEntries(self):
+        entries = []
+        for key in os.listdir(self.directory):
+            if key.startswith("."):
+                continue
+            try:
+                entries.append((os.path.getmtime(os.path.join(self.directory, key)), key))
+            except OSError:
+                pass
+        entries.sort()
+
+        self.__entries = OrderedDict()
+        for (modified, key) in entries:
+            self.__entries[key] = True
+
+    # Compile a source file with gcc, reusing cached output where possible.
+    # Flags are the rest of the command line, apart from the output file. Returns (output, error) of the compiler.
+    def compile(self, sourceFile, outputFile, flags = ""):
+        key = self.getKey(sourceFile, flags)
+        with self.__lock:
+            messages = self.lookup(key, outputFile)
+        if messages != None:
+            return ("", messages)
+
+        compileProcess = Popen("gcc " + sourceFile + " " + flags + " -o " + outputFile, stdout = PIPE, stderr = PIPE, shell = True)
+        (cOutput, cError) = compileProcess.communicate()
+        with self.__lock:
+            self.store(key, outputFile, cError)
+        return (cOutput, cError)
+
+    # Build the cache key for a compilation
+    def getKey(self, sourceFile, flags):
+        source = open(sourceFile, "r")
+        text = source.read()
+        source.close()
+
+        for pattern in self.ignorePatterns:
+            text = pattern.sub("", text)
+
+        key = hashlib.sha1(text)
+        key.update("\n" + flags)
+
+        # Included files and linked objects change the output without changing the source
+        dependencies = [os.path.join(os.path.dirname(sourceFile), include) for include in self.includePattern.findall(text)]
+        dependencies.extend([flag for flag in flags.split() if not flag.startswith("-")])
+        for dependency in dependencies:
+            key.update("\n" + self.getFileHash(dependency))
+
+        return key.hexdigest()
+
+    # Hash of the contents of a file. Hashes are kept until the file changes.
+    def getFileHash(self, fileName):
+        try:
+            status = os.stat(fileName)
+        except OSError:
+            return "missing " + fileName
+
+        signature = (os.path.abspath(fileName), status.st_mtime, status.st_size)
+        if signature not in self.__fileHashes:
+            contents = open(fileName, "rb")
+            self.__fileHashes[signature] = hashlib.sha1(contents.read()).hexdigest()
+            contents.close()
+        return self.__fileHashes[signature]
+
+    # Copy the cached output of a compilation to the output file. Returns the compiler messages, or None if not cached.
+    def lookup(self, key, outputFile):
+        entry = os.path.join(self.directory, key)
+        try:
+            messageFile = open(os.path.join(entry, "messages"), "r")
+            messages = messageFile.read()
+            messageFile.close()
+            if os.path.isfile(os.path.join(entry, "output")):
+                self.copyFile(os.path.join(entry, "output"), outputFile)
+            # Mark as recently used, for other processes sharing the cache
+            os.utime(entry, None)
+        except (IOError, OSError):
+            # Not cached, or evicted by another process
+            self.__entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self.__entries.pop(key, None)
+        self.__entries[key] = True
+        self.hits += 1
+        return messages
+
+    # Store the output and messages of a compilation. Failed compilations are stored without output.
+    def store(self, key, outputFile, messages):
+        # Entries are written to a temporary directory, then renamed, so other processes never see a partial entry
+        staging = tempfile.mkdtemp(prefix = ".", dir = self.directory)
+        if os.path.isfile(outputFile):
+            self.copyFile(outputFile, os.path.join(staging, "output"))
+        messageFile = open(os.path.join(staging, "messages"), "w")
+        messageFile.write(messages)
+        messageFile.close()
+
+        try:
+            os.rename(staging, os.path.join(self.directory, key))
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(staging, ignore_errors = True)
+
+        self.__entries.pop(key, None)
+        self.__entries[key] = True
+        if len(self.__entries) > self.maxSize:
+            self.evict()
+
+    # Remove the least-recently used entries. Entries stored by other processes are taken into account.
+    def evict(self):
+        self.loadEntries()
+        while len(self.__entries) > self.maxSize:
+            (key, value) = self.__entries.popitem(last = False)
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors = True)
+            self.evictions += 1
+
+    # Link a file where possible, as cache and workspaces usually share a file system. Otherwise, copy it.
+    def copyFile(self, source, destination):
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copy2(source, destination)
+
+    # Fraction of compilations answered from the cache
+    def getHitRate(self):
+        if self.hits + self.misses == 0:
+            return 0.0
+        return float(self.hits) / (self.hits + self.misses)
+
+    # Summary of cache use, for reporting
+    def getStatistics(self):
+        return "Compile cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses (hit rate " + str(round(self.getHitRate() * 100, 1)) + "%), " + str(len(self.__entries)) + " cached, " + str(self.evictions) + " evicted"
+
+    def size(self):
+        return len(self.__entries)
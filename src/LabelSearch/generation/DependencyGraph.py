@@ -9,6 +9,7 @@
 
 import sys
 from pycparser import c_ast, c_generator
+from ..instrumentation.Instrumentation import Instrumentation
 
 class DependencyMapVisitor(c_ast.NodeVisitor):
 
@@ -28,9 +29,14 @@ class DependencyMapVisitor(c_ast.NodeVisitor):
     def __init__(self,functions,stateVariables):
         self.functions=functions
         self.stateVariables=stateVariables
+        # Each visitor builds its own map, rather than adding to the one shared by the class
+        self.dependencyMap=[]
 
     # When we hit a function definition, grab the function code and look for defs and uses of state variables.
     def visit_FuncDef(self, node):
+        # Cost function helpers added by the instrumentation are not part of the program
+        if node.decl.name in Instrumentation.helperNames:
+            return
         # Discard anything seen before we started examining this function
         self.currentFunction=[]
         self.currentFunction.append(node.decl.name)
@@ -107,8 +113,20 @@ class ProgramDataVisitor(c_ast.NodeVisitor):
     # Generator to get C code from a node
     generator = c_generator.CGenerator()
 
+    def __init__(self):
+        # Each visitor builds its own lists, so parsing a program again does not add to the ones shared by the class
+        self.functions=[]
+        self.stateVariables=[]
+        self.typeDefs=[]
+        self.structs=[]
+        self.unions=[]
+        self.enums=[]
+
     # When we hit a function definition, grab the function name, return type, and arguments.
     def visit_FuncDef(self, node):
+        # Cost function helpers added by the instrumentation are not part of the program
+        if node.decl.name in Instrumentation.helperNames:
+            return
         function=[]
         # Name
         function.append(node.decl.name)
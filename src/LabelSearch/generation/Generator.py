@@ -6,6 +6,7 @@
 # -o <name of test suite>
 # -l <maximum single test length, default is 10 steps (assignments or calls)>
 # -m <maximum test suite size, default is 25>
+# -D (cache the parsed program data on disk, so later runs on the same program skip parsing)
 
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
@@ -16,13 +17,21 @@ import sys
 import os
 import random
 import copy
+import re
 from subprocess import call
 from pycparser import parse_file, c_parser, c_ast
 from DependencyGraph import *
 from GeneratorFactory import GeneratorFactory
 from Verifier import Verifier
 from Runner import Runner
+from ProgramBuilder import ProgramBuilder
+from Harness import Harness
+from Timeouts import Timeouts
+from Workspace import Workspace
+from CompileCache import CompileCache
+from ProgramDataCache import ProgramDataCache
 from ..structures.TestSuite import TestSuite
+from ..structures.TestCache import TestCache
 
 class Generator(): 
 
@@ -52,6 +61,22 @@ class Generator():
     verifier = Verifier()
     # Object that runs suites and calculates their score
     runner = Runner()
+    # Generated header for the prebuilt program object. If set, suites include it instead of the program.
+    programHeader = ""
+    # Data-driven test harness. If set, suites are evaluated through it where possible.
+    harness = None
+    # Cache of executed tests. If set, tests that have been executed before are not executed again.
+    testCache = None
+    # Time limits on execution, shared by the harness, verifier, and runner
+    timeouts = Timeouts()
+    # Scratch directories for compile and run artifacts, shared by the harness, verifier, and runner
+    workspace = Workspace()
+    # Cache of compiler output. If set, identical suites, objects, and drivers are only compiled once.
+    compileCache = None
+    # Cache of parsed program data. If set, the program is only parsed when it, or the files it includes, change.
+    programDataCache = None
+    # Directories searched for included headers when preprocessing the program
+    includePath = [r'utils/fake_libc_include']
 
     # Central process of instrumentation
     def generate(self,outFile):
@@ -63,73 +88,253 @@ class Generator():
         if self.getFunctions()==[] or self.getStateVariables()==[] or self.getDependencyMap()==[]:
             self.initializeProgramData()
 
-        suite = TestSuite()
-        # Generate test cases
-        suite.setTests(self.buildSuite())
-        testList = []
-        for entry in suite.getTests():
-            testList.append(1)
-        suite.setTestList(testList)
+        # Generate test cases, then build, verify, and score the suite
+        return self.evaluate(self.buildSuite(), outFile)
+
+    # Build a suite from existing test code, and verify and score it.
+    def evaluate(self, tests, outFile):
+        if self.getFunctions()==[] or self.getStateVariables()==[] or self.getDependencyMap()==[]:
+            self.initializeProgramData()
+
+        suite = self.buildSuiteFromTests(tests, outFile)
         #print(suite.getTests())
 
-        # Build suite code
-        suite.setSuiteCode(self.buildCode(suite,outFile))
+        # Tests that have been executed before are turned off, and their cached scores are used instead.
+        cached = {}
+        if self.testCache != None:
+            cached = self.lookupCachedTests(suite)
+            if len(cached) == len(suite.getTests()):
+                self.mergeCachedTests(suite, cached)
+                return suite
 
         # Print test suite to file
-        suite.setFileName(outFile)
         suite.writeSuiteFile()
 
+        # Evaluate the suite through the data-driven harness, if possible.
+        # Otherwise, compile, verify, and run the suite.
+        self.shareSettings()
+        if self.harness == None or not self.harness.run(suite):
+            self.verifyAndRun(suite)
+
+        if self.testCache != None:
+            self.mergeCachedTests(suite, cached)
+
+        return suite
+
+    # Build suites from existing test code, and score them together. Returns the suites, in the order given.
+    # Suites that cannot be evaluated through the harness are compiled into a single executable,
+    # which runs one suite per execution. This costs one compilation, instead of one per suite.
+    # Suites that crash or time out in the batch are verified and run on their own.
+    # If the harness shares prefixes, the suites it can evaluate are run together, as a single prefix trie of their tests.
+    def evaluateBatch(self, testSets, outFiles, batchFile):
+        if self.getFunctions()==[] or self.getStateVariables()==[] or self.getDependencyMap()==[]:
+            self.initializeProgramData()
+
+        self.shareSettings()
+        suites = []
+        cachedScores = []
+        pending = []
+        shared = []
+        for index in range(0, len(testSets)):
+            suite = self.buildSuiteFromTests(testSets[index], outFiles[index])
+            suites.append(suite)
+            cached = {}
+            if self.testCache != None:
+                cached = self.lookupCachedTests(suite)
+            cachedScores.append(cached)
+            if len(cached) == len(suite.getTests()):
+                continue
+
+            suite.writeSuiteFile()
+            if self.harness != None and self.harness.sharePrefixes == 1:
+                shared.append(suite)
+            elif self.harness == None or not self.harness.run(suite):
+                pending.append(suite)
+
+        if len(shared) > 0:
+            failed = self.harness.runShared(shared)
+            pending = [suite for suite in suites if suite in pending or suite in failed]
+
+        if len(pending) > 0:
+            where = open(batchFile, "w")
+            where.write(self.buildBatchCode(pending))
+            where.close()
+            failed = self.runner.runBatch(pending, batchFile)
+            self.workspace.removeFiles([batchFile])
+
+            for suite in failed:
+                self.verifyAndRun(suite)
+
+        if self.testCache != None:
+            for index in range(0, len(suites)):
+                self.mergeCachedTests(suites[index], cachedScores[index])
+
+        return suites
+
+    # Verify, then run and score, a suite that has been written to file
+    def verifyAndRun(self, suite):
         # Perform suite verification
         self.verifier.suite = suite
-        self.verifier.verify(outFile)
- 
+        self.verifier.verify(suite.getFileName())
+
         # Run the suite and calculate its score
         self.runner.suite = suite
         self.runner.run()
 
+    # Pass the execution settings on to the verifier, runner, and harness
+    def shareSettings(self):
+        self.verifier.timeouts = self.timeouts
+        self.runner.timeouts = self.timeouts
+        self.verifier.workspace = self.workspace
+        self.runner.workspace = self.workspace
+        self.verifier.compileCache = self.compileCache
+        self.runner.compileCache = self.compileCache
+        if self.harness != None:
+            self.harness.timeouts = self.timeouts
+
+    # Build a suite, with all tests turned on, from existing test code. The suite is not written or executed.
+    # Tests are renumbered in the order given, so tests can be taken from other suites.
+    def buildSuiteFromTests(self, tests, outFile):
+        suite = TestSuite()
+        testList = []
+        renumbered = []
+        for test in tests:
+            testList.append(1)
+            renumbered.append(re.sub(r"^void test\d+\(", "void test" + str(len(renumbered) + 1) + "(", test))
+        suite.setTests(renumbered)
+        suite.setTestList(testList)
+        suite.setSuiteCode(self.buildCode(suite,outFile))
+        suite.setFileName(outFile)
         return suite
 
+    # Look up each test of a suite in the test cache, and turn off the tests that are found.
+    # Returns the cached scores, keyed by cache key.
+    def lookupCachedTests(self, suite):
+        cached = {}
+        testList = suite.getTestList()
+        tests = suite.getTests()
+        for testIndex in range(0, len(tests)):
+            scores = self.testCache.lookup(tests[testIndex])
+            if scores != None:
+                cached[self.testCache.getKey(tests[testIndex])] = scores
+                testList[testIndex] = 0
+        suite.setTestList(testList)
+        return cached
+
+    # Add the cached scores back into an evaluated suite, turn the cached tests back on,
+    # and store the scores of newly executed tests in the cache.
+    # Cached scores are matched by cache key, as verification may renumber the tests.
+    def mergeCachedTests(self, suite, cached):
+        tests = suite.getTests()
+        testList = suite.getTestList()
+        testObligations = list(suite.getTestObligations())
+        if len(testObligations) != len(tests):
+            testObligations = [None] * len(tests)
+
+        count = -1
+        for testIndex in range(0, len(tests)):
+            if testObligations[testIndex] != None:
+                self.testCache.store(tests[testIndex], testObligations[testIndex])
+                count = len(testObligations[testIndex])
+            elif self.testCache.getKey(tests[testIndex]) in cached:
+                testObligations[testIndex] = cached[self.testCache.getKey(tests[testIndex])]
+                testList[testIndex] = 1
+                count = len(testObligations[testIndex])
+
+        suite.setTestList(testList)
+        suite.setTestObligations(testObligations)
+        if count != -1:
+            suite.mergeTestObligations(count)
+        suite.writeSuiteFile()
+
+    # Compile the program once, so that suites only need to compile their own test code.
+    def buildProgramObject(self):
+        builder = ProgramBuilder()
+        builder.program = self.getProgram()
+        builder.compileCache = self.compileCache
+        (self.programHeader, objectFile) = builder.build()
+        self.verifier.objectFile = objectFile
+        self.runner.objectFile = objectFile
+
+    # Build the data-driven harness, so that suites can be evaluated without compiling them.
+    def buildHarness(self):
+        if self.getFunctions()==[] or self.getStateVariables()==[] or self.getDependencyMap()==[]:
+            self.initializeProgramData()
+
+        self.harness = Harness()
+        self.harness.program = self.getProgram()
+        self.harness.programHeader = self.programHeader
+        self.harness.objectFile = self.runner.objectFile
+        self.harness.functions = self.getFunctions()
+        self.harness.stateVariables = self.getStateVariables()
+        self.harness.typeDefs = self.getTypeDefs()
+        self.harness.resetCode = self.buildReset()
+        self.harness.workspace = self.workspace
+        self.harness.compileCache = self.compileCache
+        self.harness.build()
+
     # Build test suite
     def buildSuite(self):
         suite=[]
         done=0
-        generator = GeneratorFactory()
-        generator.typeDefs = self.getTypeDefs()
-        generator.structs = self.getStructs()
-        generator.unions = self.getUnions()
+        generator = self.buildInputGenerator()
 
         while done == 0:
             # Use a degrading temperature to control the probability of adding an additional test
             temperature=(self.maxSuiteSize-float(len(suite)))/self.maxSuiteSize
             if random.random() < temperature: 
-                chance=random.random()
-                numStateful=len(self.getDependencyMap()[0])
-                numStateless=len(self.getDependencyMap()[1])
- 
-                # Add a stateless test if the random number is less than 0.5
-                # Or, if there are only stateless funtions 
-
-                # If there are no functions to choose from, throw an exception
-                if numStateful == 0 and numStateless == 0:
-                    raise Exception("There are no functions to test")  
-                # If there are no state-affecting functions, choose a stateless one
-                elif numStateful == 0:
-                    suite.append(self.buildStatelessTest(generator,str(len(suite)+1)))
-                # If there are no stateless functions, choose a stateful one 
-                elif numStateless == 0:
-                    suite.append(self.buildStatefulTest(generator,str(len(suite)+1)))
-                # If there are both, decide based on random number
-                else:
-                    if chance < 0.5:
-                        suite.append(self.buildStatelessTest(generator,str(len(suite)+1)))
-                    else:
-                        suite.append(self.buildStatefulTest(generator,str(len(suite)+1)))
-              
+                suite.append(self.buildTest(generator,str(len(suite)+1)))
             else:
                done = 1
             
         return suite
 
+    # Build the generator used to produce concrete input values
+    def buildInputGenerator(self):
+        generator = GeneratorFactory()
+        generator.typeDefs = self.getTypeDefs()
+        generator.structs = self.getStructs()
+        generator.unions = self.getUnions()
+        return generator
+
+    # Build a single test case, either stateless or state-impacting
+    def buildTest(self,inputGenerator,testID):
+        chance=random.random()
+        numStateful=len(self.getDependencyMap()[0])
+        numStateless=len(self.getDependencyMap()[1])
+ 
+        # Add a stateless test if the random number is less than 0.5
+        # Or, if there are only stateless funtions 
+
+        # If there are no functions to choose from, throw an exception
+        if numStateful == 0 and numStateless == 0:
+            raise Exception("There are no functions to test")  
+        # If there are no state-affecting functions, choose a stateless one
+        elif numStateful == 0:
+            return self.buildStatelessTest(inputGenerator,testID)
+        # If there are no stateless functions, choose a stateful one 
+        elif numStateless == 0:
+            return self.buildStatefulTest(inputGenerator,testID)
+        # If there are both, decide based on random number
+        else:
+            if chance < 0.5:
+                return self.buildStatelessTest(inputGenerator,testID)
+            else:
+                return self.buildStatefulTest(inputGenerator,testID)
+
+    # Append a single new step to a state-impacting test.
+    # The step is placed in its own block, so that the variables it declares cannot clash with the test's.
+    def appendStatefulStep(self, test):
+        maxLength = self.maxLength
+        self.maxLength = 1.0
+        step = self.buildStatefulTest(self.buildInputGenerator(), "0")
+        self.maxLength = maxLength
+
+        # Drop the declaration, the state reset, and the closing brace of the generated test
+        lines = step.strip().split("\n")[2:-1]
+        test = test.rstrip()
+        return test[:len(test) - 1] + "    {\n    " + "\n    ".join(lines) + "\n    }\n}\n\n"
+
     # Build a non-state-affecting test case
     def buildStatelessTest(self,inputGenerator,testID):
         # Choose a function that does not affect global state
@@ -476,8 +681,11 @@ class Generator():
     def buildCode(self,suite,outFile):
         code=[]
         # Add includes statements
-        code.append("#include <stdio.h>\n")
-        code.append("#include \""+os.path.basename(self.getProgram())+"\"")
+        code.append("#include <stdio.h>\n#include <stdlib.h>\n#include <string.h>\n#include <unistd.h>\n#include <signal.h>\n#include <sys/time.h>\n#include <sys/wait.h>\n")
+        if self.programHeader != "":
+            code.append("#include \""+os.path.basename(self.programHeader)+"\"")
+        else:
+            code.append("#include \""+os.path.basename(self.getProgram())+"\"")
 
         # Declare test array
         code.append("\n// Array indexing test entries.\n// tests[0] indicates number of tests\n// tests[1] corresponds to test1(), etc.\n")
@@ -485,9 +693,9 @@ class Generator():
 
         # Add code for printing to screen/file and resetting obligation scores.
 
-        code.append("\n// Flag for printing obligation scores to a CSV file at the end of execution.\nint print = 1;\n")
+        code.append("\n// Flag for writing raw obligation scores to a file.\nint print = 1;\n")
         code.append("//FILENAME")
-        code.append("\n// Flag for printing obligation scores to the screen at the end of execution.\nint screen = 1;\n\n// Prints obligation scores to the screen\nvoid printScoresToScreen(){\n    printf(\"# Obligation, Score (Unnormalized)\\n\");\n    int obligation;\n    for(obligation=1; obligation<=obligations[0]; obligation++){\n        printf(\"%d, %f\\n\",obligation,obligations[obligation]);\n    }\n}\n\n// Prints obligation scores to a file\nvoid printScoresToFile(){\n    FILE *outFile = fopen(fileName,\"w\");\n    fprintf(outFile, \"# Obligation, Score (Unnormalized)\\n\");\n    int obligation;\n    for(obligation=1; obligation<=obligations[0]; obligation++){\n        fprintf(outFile,\"%d, %f\\n\",obligation,obligations[obligation]);\n    }\n    fclose(outFile);\n}\n\n// Resets obligation scores\nvoid resetObligationScores(){\n    int obligation;\n    for(obligation=1; obligation<=obligations[0]; obligation++){\n        // Set to some high level\n        obligations[obligation] = 1000000.0;\n    }\n}\n")
+        code.append("\n// Flag for printing obligation scores to the screen at the end of execution.\n// Scores are read from the score file, so this is only set to 1 when debugging a suite by hand.\nint screen = 0;\n\n// Prints obligation scores to the screen\nvoid printScoresToScreen(){\n    printf(\"# Obligation, Score (Unnormalized)\\n\");\n    int obligation;\n    for(obligation=1; obligation<=obligations[0]; obligation++){\n        printf(\"%d, %f\\n\",obligation,obligations[obligation]);\n    }\n}\n\n// File that obligation scores are written to\nFILE *scoreFile = NULL;\n\n// Opens the score file, and writes the number of obligations\nvoid openScoreFile(){\n    if(scoreFile == NULL){\n        scoreFile = fopen(fileName,\"wb\");\n        fwrite(obligations, sizeof(float), 1, scoreFile);\n        fflush(scoreFile);\n    }\n}\n\n// Writes raw obligation scores to a file. The scores of each test are written as it runs.\nvoid printScoresToFile(){\n    openScoreFile();\n    fclose(scoreFile);\n    scoreFile = NULL;\n}\n\n// Resets obligation scores\nvoid resetObligationScores(){\n    int obligation;\n    for(obligation=1; obligation<=obligations[0]; obligation++){\n        // Set to some high level\n        obligations[obligation] = 1000000.0;\n    }\n}\n\n// Scores of the suite before the current test\nfloat suiteScores[sizeof(obligations) / sizeof(float)];\n\n// Reads the enabled tests from a mask of 0s and 1s, one per test, overriding the test list.\nvoid readTestMask(char *mask){\n    int test;\n    for(test=1; test<=tests[0] && mask[test-1] != '\\0'; test++){\n        tests[test] = (mask[test-1] == '1');\n    }\n}\n\n// Milliseconds a single test may run before it is stopped. If 0, tests are not limited.\nint testLimit = 0;\n\n// Runs a single test in a child process, and writes the scores that it achieved alone.\n// The child sends its scores back through a pipe. A test that crashes or exceeds the time limit\n// is reported on stderr, and does not affect the scores of the suite or the execution of the remaining tests.\n// Suite-level scores remain the minimum across all tests.\nvoid runTest(int testNum, void (*test)()){\n    int obligation;\n    int channel[2];\n    int status;\n    int received = 0;\n    int size = sizeof(float) * (int) obligations[0];\n    float row = testNum;\n    pid_t child;\n    memcpy(suiteScores, obligations, sizeof(obligations));\n    resetObligationScores();\n    fflush(stdout);\n    if(pipe(channel) != 0 || (child = fork()) < 0){\n        perror(\"Unable to start test\");\n        exit(1);\n    }\n    if(child == 0){\n        close(channel[0]);\n        if(testLimit > 0){\n            struct itimerval timer = {{0, 0}, {testLimit / 1000, (testLimit % 1000) * 1000}};\n            setitimer(ITIMER_REAL, &timer, NULL);\n        }\n        test();\n        write(channel[1], obligations + 1, size);\n        fflush(stdout);\n        _exit(0);\n    }\n    close(channel[1]);\n    while(received < size){\n        int bytes = read(channel[0], ((char *) (obligations + 1)) + received, size - received);\n        if(bytes <= 0)\n            break;\n        received += bytes;\n    }\n    close(channel[0]);\n    waitpid(child, &status, 0);\n    if(WIFSIGNALED(status) || received < size){\n        if(WIFSIGNALED(status) && WTERMSIG(status) == SIGALRM)\n            fprintf(stderr, \"Test %d timed out\\n\", testNum);\n        else if(WIFSIGNALED(status))\n            fprintf(stderr, \"Test %d crashed: %s\\n\", testNum, strsignal(WTERMSIG(status)));\n        memcpy(obligations, suiteScores, sizeof(obligations));\n        return;\n    }\n    if(print == 1){\n        openScoreFile();\n        fwrite(&row, sizeof(float), 1, scoreFile);\n        fwrite(obligations + 1, sizeof(float), (int) obligations[0], scoreFile);\n        fflush(scoreFile);\n    }\n    for(obligation=1; obligation<=obligations[0]; obligation++){\n        if(suiteScores[obligation] < obligations[obligation])\n            obligations[obligation] = suiteScores[obligation];\n    }\n}\n")
 
         # Add state reset
         code.append(self.buildReset())
@@ -498,16 +706,66 @@ class Generator():
         # Append test runner and main
         code.append("// Top-level test runner.\nvoid runner(){\n")
         for test in range(1,len(suite.getTestList())+1):
-            code.append("    if(tests["+str(test)+"] == 1)\n")
-            code.append("        test"+str(test)+"();\n")
+            code.extend(suite.getRunnerEntry(test))
 
-        code.append("\n    if(screen == 1)\n        printScoresToScreen();\n    if(print == 1)\n        printScoresToFile();\n}\n\nint main(){\n    runner();\n    return(0);\n}\n")
+        code.append("\n    if(screen == 1)\n        printScoresToScreen();\n    if(print == 1)\n        printScoresToFile();\n}\n\nint main(int argc, char *argv[]){\n    snapshotStateVariables();\n    if(argc > 1)\n        readTestMask(argv[1]);\n    if(argc > 2)\n        testLimit = atoi(argv[2]);\n    if(argc > 3)\n        fileName = argv[3];\n    // The score file is opened up front, so scores of finished tests survive if the suite is stopped\n    if(print == 1)\n        openScoreFile();\n    runner();\n    return(0);\n}\n")
 
         return code
 
-    # Take the list of global variables and build a state reset function that can be called by test cases.
+    # Build the code of a batch of suites, compiled into a single executable.
+    # Each suite keeps its own test list, and its tests and runner are prefixed with suite<number>_.
+    # The first argument selects the suite (starting from 0). The remaining arguments are those of a single suite.
+    def buildBatchCode(self, suites):
+        code = self.buildCode(suites[0], "")
+        code = code[:code.index("// Top-level test runner.\nvoid runner(){\n")]
+
+        text = ""
+        for line in code:
+            if line == "//TESTLIST":
+                text += "int *tests = NULL;\n"
+                for index in range(0, len(suites)):
+                    testList = [str(len(suites[index].getTestList()))] + [str(entry) for entry in suites[index].getTestList()]
+                    text += "int suite" + str(index) + "_tests[" + str(len(testList)) + "] = {" + ", ".join(testList) + "};\n"
+            elif line == "//FILENAME":
+                text += "char* fileName = \"batch.obs\";\n"
+            elif line == "//TESTS":
+                for index in range(0, len(suites)):
+                    for test in suites[index].getTests():
+                        text += re.sub(r"^void test(\d+)\(", "void suite" + str(index) + r"_test\1(", test)
+            else:
+                text += line
+
+        # Runner of each suite
+        for index in range(0, len(suites)):
+            text += "// Test runner of suite " + str(index) + ".\nvoid suite" + str(index) + "_runner(){\n"
+            for test in range(1, len(suites[index].getTestList()) + 1):
+                for line in suites[index].getRunnerEntry(test):
+                    text += line.replace(", test", ", suite" + str(index) + "_test")
+            text += "}\n\n"
+
+        runners = ", ".join(["suite" + str(index) + "_runner" for index in range(0, len(suites))])
+        testLists = ", ".join(["suite" + str(index) + "_tests" for index in range(0, len(suites))])
+        text += "// Runners and test lists of the suites in the batch\nvoid (*suiteRunners[" + str(len(suites)) + "])() = {" + runners + "};\n"
+        text += "int *suiteTests[" + str(len(suites)) + "] = {" + testLists + "};\n\n"
+        text += "// Top-level test runner. Runs the selected suite.\nvoid runner(int suite){\n    suiteRunners[suite]();\n\n    if(screen == 1)\n        printScoresToScreen();\n    if(print == 1)\n        printScoresToFile();\n}\n\n"
+        text += "int main(int argc, char *argv[]){\n    int suite = 0;\n    snapshotStateVariables();\n    if(argc > 1)\n        suite = atoi(argv[1]);\n    if(suite < 0 || suite >= " + str(len(suites)) + ")\n        return(1);\n    tests = suiteTests[suite];\n    if(argc > 2)\n        readTestMask(argv[2]);\n    if(argc > 3)\n        testLimit = atoi(argv[3]);\n    if(argc > 4)\n        fileName = argv[4];\n    // The score file is opened up front, so scores of finished tests survive if the suite is stopped\n    if(print == 1)\n        openScoreFile();\n    runner(suite);\n    return(0);\n}\n"
+        return text
+
+    # Build the state reset function that is called by test cases.
+    # On Linux, the whole writable data section (initialized and zeroed globals, and static locals) is copied once
+    # by snapshotStateVariables, at the start of main, and restored with a single copy before each test.
+    # Obligation scores are kept, as they belong to the running test.
+    # Elsewhere, the linker symbols marking the section are not available, so only the state variables
+    # with declared initial values are reset.
     def buildReset(self):
-        code="// Resets values of all state values with declared initial values.\nvoid resetStateVariables(){\n"
+        code="#if defined(__linux__)\n"
+        code=code+"// Bounds of the writable data section, set by the linker.\nextern char __data_start[], _end[];\n\n"
+        code=code+"// Copy of the writable data section, taken before any test runs.\nchar* stateSnapshot = NULL;\n\n"
+        code=code+"// Takes the snapshot that resetStateVariables restores.\nvoid snapshotStateVariables(){\n    stateSnapshot = malloc(_end - __data_start);\n    if(stateSnapshot != NULL)\n        memcpy(stateSnapshot, __data_start, _end - __data_start);\n}\n\n"
+        code=code+"// Resets all state variables to their values at startup.\nvoid resetStateVariables(){\n    float scores[sizeof(obligations) / sizeof(float)];\n    if(stateSnapshot == NULL)\n        return;\n"
+        code=code+"    memcpy(scores, obligations, sizeof(obligations));\n    memcpy(__data_start, stateSnapshot, _end - __data_start);\n    memcpy(obligations, scores, sizeof(obligations));\n}\n"
+        code=code+"#else\nvoid snapshotStateVariables(){\n}\n\n"
+        code=code+"// Resets values of all state values with declared initial values.\nvoid resetStateVariables(){\n"
         for var in self.getStateVariables():
             if var[3] !='':
                 # Has an initial value.
@@ -517,14 +775,27 @@ class Generator():
                     values=var[3].strip().split(",")
                     for index in range(0,len(values)):
                         code=code+"    "+var[0]+"["+str(index)+"] = "+str(values[index]).strip()+";\n"
-        code=code+"}\n\n"
+        code=code+"}\n#endif\n\n"
 
         return code
 
     # Read in C file and get list of functions and state variables from it.
+    # If the program data is cached, it is read from the cache instead.
     def initializeProgramData(self):
+        if self.programDataCache != None:
+            data = self.programDataCache.lookup(self.getProgram(), self.includePath)
+            if data != None:
+                self.setFunctions(data["functions"])
+                self.setStateVariables(data["stateVariables"])
+                self.setTypeDefs(data["typeDefs"])
+                self.setStructs(data["structs"])
+                self.setUnions(data["unions"])
+                self.setEnums(data["enums"])
+                self.setDependencyMap(data["dependencyMap"])
+                return
+
         # Parse the program and generate the AST
-        ast = parse_file(self.getProgram(), use_cpp=True, cpp_path = "gcc", cpp_args=['-E',r'-Iutils/fake_libc_include'])
+        ast = parse_file(self.getProgram(), use_cpp=True, cpp_path = "gcc", cpp_args=['-E'] + ['-I' + directory for directory in self.includePath])
         #ast.show()      
  
         # Use the ProgramDataVisitor to build the function, type def, and global variable lists
@@ -553,9 +824,12 @@ class Generator():
         dependencyMap=[[],[]]
         # SequenceMap is a list of defs and uses in order. Transform this into the dependency map, just a simple
         # list of variables that must be initialized before the function can be called.
+        # Variables with declared initial values never need to be initialized first.
+        summaries=self.buildSummaries(sequenceMap)
+        initialized=set([var[0] for var in self.buildClearList() if var[1] == "init"])
         for function in sequenceMap:
-            clearList=self.buildClearList()
-            dependencyEntry=self.processSequence(clearList, function[0], function[1],sequenceMap)
+            (uses, provides)=summaries[function[0]]
+            dependencyEntry=[function[0],[var for var in uses if var not in initialized],list(provides)]
             # If the uses and provides lists are empty, this is not a state-based function
             if dependencyEntry[1]==[] and dependencyEntry[2]==[]:
                 dependencyMap[1].append(dependencyEntry)
@@ -565,49 +839,127 @@ class Generator():
         self.setDependencyMap(dependencyMap)
         print self.getDependencyMap()
 
-    # Process sequence and return a dependency list
-    def processSequence(self, clearList, function, sequence, sequenceMap):
-        dependencyEntry=[function,[],[]]
-        seen=[function]
-        # Go through each interaction.
-        seqLen=len(sequence)
-        interaction=0
-        while interaction < seqLen:
-            # If we've seen it already, skip it
-            if sequence[interaction][0] not in dependencyEntry[1] or sequence[interaction][0] not in dependencyEntry[2]:
-                # It will either be a def, a use, or a function call
-                if sequence[interaction][1] == "def":
-                    # Mark it as init
-                    for entry in range(0,len(clearList)):
-                        if clearList[entry][0] == sequence[interaction][0]:
-                            clearList[entry] = [clearList[entry][0],"init"]
-                            if sequence[interaction][0] not in dependencyEntry[2]:
-                                dependencyEntry[2].append(sequence[interaction][0])
-                            break
-                elif sequence[interaction][1] == "use":
+        if self.programDataCache != None:
+            self.programDataCache.store(self.getProgram(), self.includePath, {"functions": self.getFunctions(),
+                "stateVariables": self.getStateVariables(), "typeDefs": self.getTypeDefs(), "structs": self.getStructs(),
+                "unions": self.getUnions(), "enums": self.getEnums(), "dependencyMap": self.getDependencyMap()})
+
+    # Summarize the interactions of each function with state variables, including those of the functions it calls.
+    # A summary holds the variables that a function uses before defining them, and the variables it defines, in order.
+    # Each function is summarized once, after the functions it calls, so summaries of callees are reused by every caller.
+    # Recursive functions are summarized together, until their summaries stop changing.
+    def buildSummaries(self, sequenceMap):
+        sequences={}
+        order=[]
+        for function in sequenceMap:
+            if function[0] not in sequences:
+                sequences[function[0]]=function[1]
+                order.append(function[0])
+
+        calls={}
+        for name in order:
+            calls[name]=[entry[0] for entry in sequences[name] if entry[1] == "function" and entry[0] in sequences]
+
+        summaries={}
+        for component in self.getCallComponents(order, calls):
+            if len(component) == 1 and component[0] not in calls[component[0]]:
+                summaries[component[0]]=self.summarizeSequence(sequences[component[0]], summaries)
+                continue
+
+            for name in component:
+                summaries[name]=([],[])
+            changed=True
+            while changed:
+                changed=False
+                for name in component:
+                    summary=self.summarizeSequence(sequences[name], summaries)
+                    if set(summary[0]) != set(summaries[name][0]) or set(summary[1]) != set(summaries[name][1]):
+                        changed=True
+                    summaries[name]=summary
+
+        return summaries
+
+    # Summarize a sequence of defs, uses, and function calls, using the summaries of the functions called.
+    # Calls to functions without a summary (e.g., library functions) have no effect.
+    def summarizeSequence(self, sequence, summaries):
+        uses=[]
+        provides=[]
+        used=set()
+        defined=set()
+        for interaction in sequence:
+            if interaction[1] == "def":
+                interactions=[(interaction[0],"def")]
+            elif interaction[1] == "use":
+                interactions=[(interaction[0],"use")]
+            elif interaction[1] == "function" and interaction[0] in summaries:
+                summary=summaries[interaction[0]]
+                interactions=[(var,"use") for var in summary[0]]+[(var,"def") for var in summary[1]]
+            else:
+                continue
+
+            for (var, kind) in interactions:
+                if kind == "def":
+                    if var not in defined:
+                        defined.add(var)
+                        provides.append(var)
+                elif var not in defined and var not in used:
                     # If the variable is uninit, then we depend on it being initialized by another function first.
-                    for entry in clearList:
-                        if entry[0] == sequence[interaction][0]:
-                            if entry[1] == "uninit":
-                                if sequence[interaction][0] not in dependencyEntry[1]:
-                                    dependencyEntry[1].append(sequence[interaction][0])
+                    used.add(var)
+                    uses.append(var)
+
+        return (uses, provides)
+
+    # Group functions into the strongly connected components of the call graph, using Tarjan's algorithm.
+    # Components are returned with the functions they call before them. The search is iterative, as call chains may be deep.
+    def getCallComponents(self, order, calls):
+        index={}
+        lowLink={}
+        stack=[]
+        onStack=set()
+        components=[]
+        positions=dict([(order[place],place) for place in range(0,len(order))])
+        for root in order:
+            if root in index:
+                continue
+
+            work=[(root,0)]
+            while len(work) > 0:
+                (name, position)=work.pop()
+                if position == 0:
+                    index[name]=len(index)
+                    lowLink[name]=index[name]
+                    stack.append(name)
+                    onStack.add(name)
+                else:
+                    # Returning from the function called at the previous position
+                    lowLink[name]=min(lowLink[name], lowLink[calls[name][position-1]])
+
+                descended=False
+                while position < len(calls[name]):
+                    callee=calls[name][position]
+                    position+=1
+                    if callee not in index:
+                        work.append((name,position))
+                        work.append((callee,0))
+                        descended=True
+                        break
+                    elif callee in onStack:
+                        lowLink[name]=min(lowLink[name], index[callee])
+                if descended:
+                    continue
+
+                if lowLink[name] == index[name]:
+                    component=[]
+                    while True:
+                        member=stack.pop()
+                        onStack.remove(member)
+                        component.append(member)
+                        if member == name:
                             break
-                elif sequence[interaction][1] == "function":
-                    # If a function is called, put in its interactions and process them.
-                    # Only append a function once - if a variable is uninitialized the first time, it doesn't matter if we call it again.
-                    if sequence[interaction][0] not in seen:
-                        seen.append(sequence[interaction][0])
-                        for toInline in sequenceMap:
-                            if toInline[0] == sequence[interaction][0]:
-                                # Add interactions to the list
-                                for line in range(0,len(toInline[1])):
-                                    sequence.insert(interaction+line+1,toInline[1][line])
-                                seqLen = len(sequence)
-                                break
-            
-            interaction+=1
+                    component.sort(key=lambda member: positions[member])
+                    components.append(component)
 
-        return dependencyEntry
+        return components
 
     # Build the clear list - a list of global variables that are safe to use.
     def buildClearList(self):
@@ -683,14 +1035,14 @@ def main(argv):
     maxLength = 10.0
 
     try:
-        opts, args = getopt.getopt(argv,"hp:o:l:m:")
+        opts, args = getopt.getopt(argv,"hp:o:l:m:D")
     except getopt.GetoptError:
-        print 'Generator.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size>'
+        print 'Generator.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size> -D'
       	sys.exit(2)
   		
     for opt, arg in opts:
         if opt == "-h":
-            print 'Generator.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size>'
+            print 'Generator.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size> -D'
             sys.exit()
       	elif opt == "-p":
             if arg == "":
@@ -703,6 +1055,8 @@ def main(argv):
             maxLength = float(arg)
         elif opt == "-m":
             maxSuiteSize = float(arg)
+        elif opt == "-D":
+            generator.programDataCache = ProgramDataCache()
 
     if program == '':
         raise Exception('No program specified')
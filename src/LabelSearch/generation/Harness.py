@@ -0,0 +1,719 @@
+# Gregory Gay (greg@greggay.com)
+# Data-driven test harness. A single generic driver is compiled per program.
+# Test suites are translated into a line-based list of test steps that the
+# driver reads from standard input and dispatches to the program's functions,
+# so evaluating a suite costs one process execution instead of a compilation.
+
+# Step format (one step per line):
+# T <test number>                          - Start of a test
+# R                                        - Reset state variables to their values at startup
+# A <variable id> <index> <value>          - Assign a value to a state variable (index is 0 for non-arrays)
+# C <function id> <slot> <argument>...     - Call a function, storing the return value in a slot (-1 to discard)
+# P                                        - Start of a prefix trie of tests, where each step is shared by all tests starting with it
+# E <test number>                          - End of a test in the prefix trie. Writes the scores reached so far.
+# {                                        - Start of a branch of the prefix trie, run in a forked child
+# }                                        - End of a branch
+# Values are either literals, @<slot> (a stored return value), or $<variable id>:<index> (a state variable).
+
+# In fork-server mode, the driver initializes once and waits for requests on standard input.
+# Each request is the length of the step text on its own line, followed by the step text.
+# The driver forks a fresh child per request, which runs the steps and writes its scores to a pipe.
+# The driver then writes the child's exit status (a native int, negative for a signal), the length
+# of the scores in bytes (a native int), and the scores.
+
+# Scores are written as native floats: the number of obligations, followed by one row per test.
+# Each row holds the test number and the scores achieved by that test alone.
+# The suite-level score of an obligation is the minimum across all rows.
+
+# In a prefix trie, the steps before a branch are executed once, and each branch but the last continues in a forked child,
+# which inherits the program state and scores reached by the shared steps. The last branch continues in the parent.
+# Each path from the start of the trie to the end of a test has the time limit of a single test.
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import re
+import array
+import struct
+import signal
+from collections import OrderedDict
+from subprocess import Popen, PIPE
+from Timeouts import Timeouts
+from Workspace import Workspace
+
+class Harness():
+
+    # Program to build the harness for
+    program = ""
+    # Generated header for a prebuilt program object. If set, the harness includes it instead of the program.
+    programHeader = ""
+    # Prebuilt object file of the program
+    objectFile = ""
+    # Harness executable
+    executable = ""
+    # Scratch directory holding the driver and executable
+    workspace = Workspace()
+    directory = ""
+    # Cache of compiled drivers. If set, the driver is only compiled when the program changes.
+    compileCache = None
+    # Program data, as gathered by the generator
+    functions = []
+    stateVariables = []
+    typeDefs = []
+    # Code of the state reset function
+    resetCode = ""
+    # Number of slots available for storing return values
+    maxSlots = 1024
+    # If 1, suites are sent to a long-lived fork-server instead of starting the driver per suite
+    forkServer = 0
+    # If 1, suites evaluated together share the execution of the steps that start several of their tests
+    sharePrefixes = 0
+    # Number of test steps sent to the harness as a prefix trie, and the number executed after sharing
+    requestedSteps = 0
+    executedSteps = 0
+    # Running fork-server process, and the id of the process that started it
+    server = None
+    serverOwner = -1
+    # Time limits on execution
+    timeouts = Timeouts()
+
+    # Regular expressions used to translate test code into steps
+    callPattern = re.compile(r"^(?:(?P<type>.+?)\s+(?P<var>call\d*)\s*=\s*)?(?P<function>\w+)\((?P<args>.*)\);$")
+    assignPattern = re.compile(r"^(?P<var>\w+)(?:\[(?P<index>\d+)\])?\s*=\s*(?P<value>.+);$")
+    literalPattern = re.compile(r"^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+    referencePattern = re.compile(r"^(?P<var>\w+)(?:\[(?P<index>\d+)\])?$")
+
+    # Types that the driver can pass around as numbers
+    scalarTypes = ["int", "signed int", "unsigned int", "short", "short int", "signed short", "signed short int",
+        "unsigned short", "unsigned short int", "long", "long int", "signed long", "signed long int",
+        "unsigned long", "unsigned long int", "long long", "long long int", "signed long long",
+        "signed long long int", "unsigned long long", "unsigned long long int", "char", "signed char",
+        "unsigned char", "float", "float_t", "double", "double_t", "long double", "bool", "_Bool"]
+
+    # Static part of the driver: step execution, score reporting, the fork-server, and main
+    driverCode = r"""// Scores of the suite before the current test
+float harnessSuiteScores[sizeof(obligations) / sizeof(float)];
+// Test currently being executed (0 if none)
+int harnessCurrentTest = 0;
+// Milliseconds a single test may run before it is stopped. If 0, tests are not limited.
+int harnessTestLimit = 0;
+
+// Starts the test timer, or stops it if the time is 0. A test that exceeds the limit is stopped by SIGALRM.
+void harnessSetTimer(int milliseconds){
+    struct itimerval timer = {{0, 0}, {milliseconds / 1000, (milliseconds % 1000) * 1000}};
+    setitimer(ITIMER_REAL, &timer, NULL);
+}
+
+// Starts a test. Scores are reset, so that they reflect this test alone.
+void harnessStartTest(int test){
+    int obligation;
+    memcpy(harnessSuiteScores, obligations, sizeof(obligations));
+    for(obligation=1; obligation<=obligations[0]; obligation++){
+        obligations[obligation] = 1000000.0;
+    }
+    harnessCurrentTest = test;
+    if(harnessTestLimit > 0)
+        harnessSetTimer(harnessTestLimit);
+}
+
+// Ends a test. Writes its scores, and folds them back into the suite scores.
+void harnessEndTest(){
+    int obligation;
+    float testNum = harnessCurrentTest;
+    if(harnessTestLimit > 0)
+        harnessSetTimer(0);
+    fwrite(&testNum, sizeof(float), 1, harnessOutput);
+    fwrite(obligations + 1, sizeof(float), (int) obligations[0], harnessOutput);
+    for(obligation=1; obligation<=obligations[0]; obligation++){
+        if(harnessSuiteScores[obligation] < obligations[obligation])
+            obligations[obligation] = harnessSuiteScores[obligation];
+    }
+    harnessCurrentTest = 0;
+}
+
+// Resets the program state before a test. The state of the harness itself is kept.
+void harnessResetState(){
+    FILE* input = harnessInput;
+    FILE* output = harnessOutput;
+    int test = harnessCurrentTest;
+    int limit = harnessTestLimit;
+    float scores[sizeof(obligations) / sizeof(float)];
+    memcpy(scores, harnessSuiteScores, sizeof(harnessSuiteScores));
+    resetStateVariables();
+    harnessInput = input;
+    harnessOutput = output;
+    harnessCurrentTest = test;
+    harnessTestLimit = limit;
+    memcpy(harnessSuiteScores, scores, sizeof(harnessSuiteScores));
+}
+
+// Writes the scores of a test in a prefix trie. Longer tests that share its steps carry on from the same scores.
+void harnessWriteRow(int test){
+    float testNum = test;
+    fwrite(&testNum, sizeof(float), 1, harnessOutput);
+    fwrite(obligations + 1, sizeof(float), (int) obligations[0], harnessOutput);
+}
+
+// Starts a branch of a prefix trie. The branch is run by a forked child, while the parent waits, then skips it.
+// The test timer is paused while the child runs, and the child gets the time that remained.
+// A child that crashes or times out stops the parent in the same way, so the failure is reported as before.
+void harnessBranch(){
+    struct itimerval remaining;
+    struct itimerval stopped = {{0, 0}, {0, 0}};
+    char token[16];
+    int status = 0;
+    int depth = 1;
+    pid_t child;
+    setitimer(ITIMER_REAL, &stopped, &remaining);
+    fflush(harnessOutput);
+    fflush(stdout);
+    child = fork();
+    if(child < 0){
+        perror("Unable to start branch");
+        exit(1);
+    }
+    if(child == 0){
+        setitimer(ITIMER_REAL, &remaining, NULL);
+        return;
+    }
+    waitpid(child, &status, 0);
+    if(WIFSIGNALED(status)){
+        signal(WTERMSIG(status), SIG_DFL);
+        raise(WTERMSIG(status));
+    }
+    if(WEXITSTATUS(status) != 0)
+        exit(WEXITSTATUS(status));
+    setitimer(ITIMER_REAL, &remaining, NULL);
+    while(depth > 0 && fscanf(harnessInput, "%15s", token) == 1){
+        if(token[0] == '{')
+            depth++;
+        else if(token[0] == '}')
+            depth--;
+    }
+}
+
+// Runs all steps from the input
+void harnessRunSteps(){
+    char step[16];
+    int id, index, slot;
+    fwrite(obligations, sizeof(float), 1, harnessOutput);
+    while(fscanf(harnessInput, "%15s", step) == 1){
+        if(step[0] == 'T'){
+            fscanf(harnessInput, "%d", &id);
+            if(harnessCurrentTest != 0)
+                harnessEndTest();
+            harnessStartTest(id);
+        }else if(step[0] == 'R'){
+            harnessResetState();
+        }else if(step[0] == 'A'){
+            fscanf(harnessInput, "%d %d", &id, &index);
+            harnessSetVariable(id, index, harnessReadValue());
+        }else if(step[0] == 'C'){
+            fscanf(harnessInput, "%d %d", &id, &slot);
+            harnessCallFunction(id, slot);
+        }else if(step[0] == 'P'){
+            if(harnessTestLimit > 0)
+                harnessSetTimer(harnessTestLimit);
+        }else if(step[0] == 'E'){
+            fscanf(harnessInput, "%d", &id);
+            harnessWriteRow(id);
+        }else if(step[0] == '{'){
+            harnessBranch();
+        }else if(step[0] == '}'){
+            fflush(harnessOutput);
+            _exit(0);
+        }
+    }
+    if(harnessCurrentTest != 0)
+        harnessEndTest();
+    fflush(harnessOutput);
+}
+
+// Waits for requests, and runs each in a fresh child process
+int harnessServe(){
+    long length;
+    int code, size, pipes[2];
+    char* scores = malloc(4096);
+    int capacity = 4096;
+    while(scanf("%ld", &length) == 1 && length > 0){
+        char* buffer = malloc(length);
+        getchar();
+        if(fread(buffer, 1, length, stdin) != length)
+            break;
+        fflush(stdout);
+        pipe(pipes);
+        pid_t child = fork();
+        if(child == 0){
+            close(pipes[0]);
+            harnessInput = fmemopen(buffer, length, "r");
+            harnessOutput = fdopen(pipes[1], "w");
+            harnessRunSteps();
+            fclose(harnessOutput);
+            _exit(0);
+        }
+
+        // Read the scores before waiting, so that the child never blocks on a full pipe
+        close(pipes[1]);
+        size = 0;
+        ssize_t received;
+        do{
+            if(size == capacity){
+                capacity *= 2;
+                scores = realloc(scores, capacity);
+            }
+            received = read(pipes[0], scores + size, capacity - size);
+            if(received > 0)
+                size += received;
+        }while(received > 0);
+        close(pipes[0]);
+
+        int status = 0;
+        waitpid(child, &status, 0);
+        free(buffer);
+        code = WIFSIGNALED(status) ? -WTERMSIG(status) : WEXITSTATUS(status);
+        if(code != 0)
+            size = 0;
+        fwrite(&code, sizeof(int), 1, stdout);
+        fwrite(&size, sizeof(int), 1, stdout);
+        fwrite(scores, 1, size, stdout);
+        fflush(stdout);
+    }
+    return(0);
+}
+
+// Reads all of a stream into memory, and opens it for reading steps.
+// Processes forked at the branches of a prefix trie then each keep their own position in the steps.
+FILE* harnessLoadInput(FILE* stream){
+    size_t size = 0;
+    size_t capacity = 4096;
+    size_t received;
+    char* buffer = malloc(capacity);
+    while((received = fread(buffer + size, 1, capacity - size, stream)) > 0){
+        size += received;
+        if(size == capacity){
+            capacity *= 2;
+            buffer = realloc(buffer, capacity);
+        }
+    }
+    if(size == 0)
+        return stream;
+    return fmemopen(buffer, size, "r");
+}
+
+int main(int argc, char** argv){
+    int arg;
+    int serve = 0;
+    snapshotStateVariables();
+    for(arg=1; arg<argc; arg++){
+        if(strcmp(argv[arg], "server") == 0)
+            serve = 1;
+        else
+            harnessTestLimit = atoi(argv[arg]);
+    }
+    if(serve == 1)
+        return harnessServe();
+
+    harnessInput = harnessLoadInput(stdin);
+    harnessOutput = stdout;
+    harnessRunSteps();
+    return(0);
+}
+"""
+
+    # Maps from names to the ids used in steps. Only supported functions and variables are included.
+    __functionIds = {}
+    __functionArgs = {}
+    __variableIds = {}
+
+    # Generate and compile the driver
+    def build(self):
+        if self.program == "":
+            raise Exception("No program set for building the harness.")
+
+        self.buildIds()
+
+        # The driver is built in its own workspace, so searches on the same program do not overwrite each other's driver
+        self.directory = self.workspace.create()
+        base = os.path.basename(self.program[:self.program.index(".c")]) + "_harness"
+        driverFile = os.path.join(self.directory, base + ".c")
+        self.executable = os.path.join(self.directory, base)
+
+        where = open(driverFile, "w")
+        where.write(self.buildDriver())
+        where.close()
+
+        if self.compileCache != None:
+            (cOutput, cError) = self.compileCache.compile(driverFile, self.executable, self.objectFile)
+        else:
+            compileProcess = Popen("gcc " + driverFile + " " + self.objectFile + " -o " + self.executable, stdout = PIPE, stderr = PIPE, shell = True)
+            (cOutput, cError) = compileProcess.communicate()
+        if not os.path.isfile(self.executable):
+            raise Exception("Harness failed to compile: " + cError)
+
+    # Assign ids to the functions and state variables the driver supports
+    def buildIds(self):
+        self.__functionIds = {}
+        self.__functionArgs = {}
+        self.__variableIds = {}
+
+        for index in range(0,len(self.functions)):
+            function = self.functions[index]
+            if not self.isScalar(" ".join(function[1])) and " ".join(function[1]) != "void":
+                continue
+            args = []
+            supported = 1
+            for arg in function[2]:
+                words = arg.strip().split()
+                if len(words) == 0 or words == ["void"]:
+                    continue
+                if "*" in arg or "[" in arg or not self.isScalar(" ".join(words[:len(words)-1])):
+                    supported = 0
+                    break
+                args.append(" ".join(words[:len(words)-1]))
+            if supported == 1:
+                self.__functionIds[function[0]] = index
+                self.__functionArgs[function[0]] = args
+
+        for index in range(0,len(self.stateVariables)):
+            var = self.stateVariables[index]
+            if (var[1] == "var" or "array" in var[1]) and "const" not in var[2] and self.isScalar(" ".join(var[2])):
+                self.__variableIds[var[0]] = index
+
+    # Is this a type that the driver can handle as a number?
+    def isScalar(self, typeName):
+        typeName = typeName.replace("const ", "").replace("volatile ", "").strip()
+        if typeName in self.scalarTypes or typeName.startswith("enum "):
+            return True
+
+        for entry in self.typeDefs:
+            if typeName == entry[0]:
+                return self.isScalar(" ".join(entry[1]))
+
+        return False
+
+    # Build the code of the driver
+    def buildDriver(self):
+        code = "// Generated by LabelSearch. Data-driven test harness for " + os.path.basename(self.program) + "\n"
+        code += "#include <stdio.h>\n#include <stdlib.h>\n#include <string.h>\n#include <unistd.h>\n#include <signal.h>\n#include <sys/time.h>\n#include <sys/types.h>\n#include <sys/wait.h>\n"
+        if self.programHeader != "":
+            code += "#include \"" + os.path.abspath(self.programHeader) + "\"\n\n"
+        else:
+            code += "#include \"" + os.path.abspath(self.program) + "\"\n\n"
+
+        code += "// Source of test steps, and destination of scores\nFILE* harnessInput;\nFILE* harnessOutput;\n\n"
+        code += "// Return values stored by call steps\nlong double harnessSlots[" + str(self.maxSlots) + "];\n\n"
+        code += self.resetCode
+
+        # State variable access
+        code += "// Reads the value of a state variable\nlong double harnessGetVariable(int id, int index){\n    switch(id){\n"
+        for name in self.__variableIds:
+            var = self.stateVariables[self.__variableIds[name]]
+            code += "    case " + str(self.__variableIds[name]) + ":\n"
+            if "array" in var[1]:
+                code += "        return (long double) " + name + "[index];\n"
+            else:
+                code += "        return (long double) " + name + ";\n"
+        code += "    }\n    return 0;\n}\n\n"
+
+        code += "// Assigns a value to a state variable\nvoid harnessSetVariable(int id, int index, long double value){\n    switch(id){\n"
+        for name in self.__variableIds:
+            var = self.stateVariables[self.__variableIds[name]]
+            code += "    case " + str(self.__variableIds[name]) + ":\n"
+            if "array" in var[1]:
+                code += "        " + name + "[index] = value;\n"
+            else:
+                code += "        " + name + " = value;\n"
+            code += "        break;\n"
+        code += "    }\n}\n\n"
+
+        # Values
+        code += "// Reads a value: a literal, a stored return value (@slot), or a state variable ($id:index)\n"
+        code += "long double harnessReadValue(){\n    char token[128];\n    if(fscanf(harnessInput, \"%127s\", token) != 1)\n        return 0;\n"
+        code += "    if(token[0] == '@')\n        return harnessSlots[atoi(token + 1)];\n"
+        code += "    if(token[0] == '$'){\n        char* index = strchr(token, ':');\n"
+        code += "        return harnessGetVariable(atoi(token + 1), index != NULL ? atoi(index + 1) : 0);\n    }\n"
+        code += "    return strtold(token, NULL);\n}\n\n"
+
+        # Function dispatch
+        code += "// Reads the arguments of a function, calls it, and stores the return value\n"
+        code += "void harnessCallFunction(int id, int slot){\n    long double result = 0;\n    switch(id){\n"
+        for name in self.__functionIds:
+            function = self.functions[self.__functionIds[name]]
+            args = self.__functionArgs[name]
+            code += "    case " + str(self.__functionIds[name]) + ":{\n"
+            for index in range(0,len(args)):
+                code += "        long double arg" + str(index) + " = harnessReadValue();\n"
+            call = name + "(" + ", ".join(["arg" + str(index) for index in range(0,len(args))]) + ")"
+            if " ".join(function[1]) == "void":
+                code += "        " + call + ";\n"
+            else:
+                code += "        result = (long double) " + call + ";\n"
+            code += "        break;\n    }\n"
+        code += "    }\n    if(slot >= 0 && slot < " + str(self.maxSlots) + ")\n        harnessSlots[slot] = result;\n}\n\n"
+
+        code += self.driverCode
+
+        return code
+
+    # Translate the enabled tests of a suite into steps. Returns None if a test uses features the driver does not support.
+    def translateSuite(self, suite):
+        tests = self.translateTests(suite)
+        if tests == None:
+            return None
+
+        steps = []
+        for (testNum, testSteps) in tests:
+            steps.append("T " + str(testNum))
+            steps.extend(testSteps)
+
+        return steps
+
+    # Translate the enabled tests of a suite into a list of (test number, steps).
+    # Returns None if a test uses features the driver does not support.
+    def translateTests(self, suite):
+        translated = []
+        tests = suite.getTests()
+        testList = suite.getTestList()
+        for testNum in range(0,len(tests)):
+            if testList[testNum] != 1:
+                continue
+            testSteps = self.translateTest(tests[testNum])
+            if testSteps == None:
+                return None
+            translated.append((testNum + 1, testSteps))
+
+        return translated
+
+    # Translate the code of a single test into steps. Returns None if it cannot be translated.
+    def translateTest(self, test):
+        steps = []
+        lines = test.strip().split("\n")
+        # First and last lines are the test declaration and closing brace
+        for line in lines[1:len(lines)-1]:
+            line = line.strip()
+            if line == "" or line.startswith("//"):
+                continue
+            elif line == "{" or line == "}":
+                # Blocks only scope the variables declared by appended steps. Later declarations replace earlier ones.
+                continue
+            elif line == "resetStateVariables();":
+                steps.append("R")
+                continue
+
+            match = self.callPattern.match(line)
+            if match != None and match.group("function") in self.__functionIds:
+                slot = "-1"
+                if match.group("var") != None and match.group("var") != "call":
+                    slot = match.group("var")[4:]
+                    if int(slot) >= self.maxSlots:
+                        return None
+
+                step = "C " + str(self.__functionIds[match.group("function")]) + " " + slot
+                if match.group("args").strip() != "":
+                    for arg in match.group("args").split(","):
+                        value = self.translateValue(arg.strip())
+                        if value == None:
+                            return None
+                        step += " " + value
+                steps.append(step)
+                continue
+
+            match = self.assignPattern.match(line)
+            if match != None and match.group("var") in self.__variableIds:
+                value = self.translateValue(match.group("value").strip())
+                if value == None:
+                    return None
+                index = match.group("index")
+                if index == None:
+                    index = "0"
+                steps.append("A " + str(self.__variableIds[match.group("var")]) + " " + index + " " + value)
+                continue
+
+            return None
+
+        return steps
+
+    # Translate an argument or assigned value. Returns None if it cannot be translated.
+    def translateValue(self, value):
+        if self.literalPattern.match(value):
+            return value
+
+        match = self.referencePattern.match(value)
+        if match != None:
+            name = match.group("var")
+            if re.match(r"^call\d+$", name) and match.group("index") == None:
+                return "@" + name[4:]
+            elif name in self.__variableIds:
+                index = match.group("index")
+                if index == None:
+                    index = "0"
+                return "$" + str(self.__variableIds[name]) + ":" + index
+
+        return None
+
+    # Execute a suite through the driver and update its obligation scores.
+    # Returns False if the suite could not be evaluated by the harness.
+    def run(self, suite):
+        steps = self.translateSuite(suite)
+        if steps == None:
+            return False
+
+        output = self.execute(steps)
+        if output == None:
+            return False
+
+        suite.readObligations(output)
+        return True
+
+    # Execute the enabled tests of several suites through the driver, arranged in a prefix trie,
+    # so that steps starting several tests are executed once. Returns the suites that could not be evaluated by the harness.
+    def runShared(self, suites):
+        root = {"children": OrderedDict(), "ends": []}
+        shared = []
+        failed = []
+        # Suite and test number of each test in the trie
+        ids = []
+        for suite in suites:
+            tests = self.translateTests(suite)
+            if tests == None:
+                failed.append(suite)
+                continue
+
+            for (testNum, testSteps) in tests:
+                node = root
+                for step in testSteps:
+                    if step not in node["children"]:
+                        node["children"][step] = {"children": OrderedDict(), "ends": []}
+                        self.executedSteps += 1
+                    node = node["children"][step]
+                self.requestedSteps += len(testSteps)
+                node["ends"].append(len(ids))
+                ids.append((len(shared), testNum))
+            shared.append(suite)
+
+        if len(shared) == 0:
+            return failed
+
+        output = self.execute(["P"] + self.serializeTrie(root))
+        if output == None:
+            # A test crashed or hung. Each suite is run on its own, so that only its own suite is handed to the verifier.
+            for suite in shared:
+                if not self.run(suite):
+                    failed.append(suite)
+            return [suite for suite in suites if suite in failed]
+
+        # Rows are split by suite, and numbered as the tests of their suite
+        scores = array.array("f")
+        scores.fromstring(output)
+        count = int(scores[0])
+        rows = [array.array("f", [count]) for suite in shared]
+        for start in range(1, len(scores) - count, count + 1):
+            (index, testNum) = ids[int(scores[start])]
+            rows[index].append(testNum)
+            rows[index].extend(scores[start + 1:start + 1 + count])
+
+        for index in range(0, len(shared)):
+            shared[index].readObligations(rows[index].tostring())
+        return failed
+
+    # Write a prefix trie as steps. Each branch but the last is enclosed in braces, and run in a forked child.
+    def serializeTrie(self, root):
+        steps = []
+        # Nodes still to be written, and the braces around them. Kept as a stack, as tests may be long.
+        stack = [root]
+        while len(stack) > 0:
+            item = stack.pop()
+            if isinstance(item, str):
+                steps.append(item)
+                continue
+
+            for testId in item["ends"]:
+                steps.append("E " + str(testId))
+            children = item["children"].items()
+            work = []
+            for (step, child) in children[:len(children)-1]:
+                work.extend(["{", step, child, "}"])
+            if len(children) > 0:
+                work.extend([children[len(children)-1][0], children[len(children)-1][1]])
+            work.reverse()
+            stack.extend(work)
+
+        return steps
+
+    # Execute steps through the driver. Returns the raw scores, or None if the driver did not exit normally.
+    def execute(self, steps):
+        if self.forkServer == 1:
+            return self.runOnServer("\n".join(steps) + "\n")
+
+        (output, error, code) = self.timeouts.execute([self.executable, str(self.timeouts.getTestLimitMillis())], "\n".join(steps) + "\n")
+        if code != 0:
+            # Crashing and hanging suites are handled by the verifier
+            self.recordTimeout(code)
+            return None
+        return output
+
+    # Summary of the steps saved by sharing prefixes, for reporting
+    def getStatistics(self):
+        saved = 0.0
+        if self.requestedSteps > 0:
+            saved = 100.0 * (self.requestedSteps - self.executedSteps) / self.requestedSteps
+        return "Shared prefixes: " + str(self.executedSteps) + " of " + str(self.requestedSteps) + " test steps executed (" + str(round(saved, 1)) + "% saved)"
+
+    # Start the fork-server. Each process keeps its own server, as forked workers cannot share the pipes.
+    def startServer(self):
+        self.server = Popen([self.executable, "server", str(self.timeouts.getTestLimitMillis())], stdin = PIPE, stdout = PIPE, preexec_fn = os.setsid)
+        self.serverOwner = os.getpid()
+
+    # Stop the fork-server
+    def stopServer(self):
+        if self.server != None and self.serverOwner == os.getpid():
+            self.server.stdin.close()
+            self.server.wait()
+        self.server = None
+
+    # Stop the fork-server and remove the driver, once the harness is no longer needed
+    def close(self):
+        self.stopServer()
+        self.workspace.remove(self.directory)
+        self.directory = ""
+
+    # Send steps to the fork-server. Returns the raw scores, or None if the child did not exit normally.
+    def runOnServer(self, stepText):
+        if self.server == None or self.serverOwner != os.getpid():
+            self.startServer()
+
+        try:
+            self.server.stdin.write(str(len(stepText)) + "\n" + stepText)
+            self.server.stdin.flush()
+        except IOError:
+            # The server died. Start a new one for the next request.
+            self.server = None
+            return None
+
+        # A server that exceeds the suite limit is killed, along with its child
+        timer = self.timeouts.watch(self.server)
+        header = self.server.stdout.read(8)
+        if len(header) < 8:
+            self.timeouts.stopWatching(timer)
+            if self.timeouts.hasTimedOut(self.server):
+                self.timeouts.suiteTimeouts += 1
+                self.timeouts.timeLost += self.timeouts.suiteLimit
+            self.server = None
+            return None
+
+        (status, size) = struct.unpack("ii", header)
+        output = self.server.stdout.read(size)
+        self.timeouts.stopWatching(timer)
+        if status != 0:
+            self.recordTimeout(status)
+            return None
+
+        return output
+
+    # Count a test stopped by the test timer. Exit codes are negative signal numbers.
+    def recordTimeout(self, code):
+        if code == -signal.SIGALRM:
+            self.timeouts.testTimeouts += 1
+            self.timeouts.timeLost += self.timeouts.testLimit
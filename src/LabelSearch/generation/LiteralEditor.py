@@ -0,0 +1,74 @@
+# Gregory Gay (greg@greggay.com)
+# Reads and replaces the literal inputs in the code of a test case.
+# Literals are integers, floating-point numbers, and character constants, including array elements.
+# Numbers that are part of names or array indices, and commented-out lines, are not counted.
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import re
+import string
+import random
+
+class LiteralEditor():
+
+    # Literals in test code: floats, integers, and character constants.
+    literalPattern = re.compile(r"(?<![\w.\[])(-?\d+\.\d*(?:[eE][-+]?\d+)?|-?\d+(?:[eE][-+]?\d+)?|'(?:\\.|[^'\\])')(?![\w.\]])")
+
+    # Get the literals in a test, in order, as (value, kind) pairs.
+    # Kinds are "int", "float", and "char". The test declaration and commented-out lines are skipped.
+    def getLiterals(self, test):
+        literals = []
+        for (line, match) in self.findLiterals(test):
+            text = match.group(1)
+            if text.startswith("'"):
+                literals.append((ord(text[1:-1].decode("string_escape")), "char"))
+            elif "." in text or "e" in text or "E" in text:
+                literals.append((float(text), "float"))
+            else:
+                literals.append((int(text), "int"))
+        return literals
+
+    # Replace a literal in a test with a new value
+    def setLiteral(self, test, literalIndex, value, kind):
+        if kind == "char":
+            if chr(int(value)) in string.printable[:95] and chr(int(value)) not in "'\\":
+                text = "'" + chr(int(value)) + "'"
+            else:
+                text = "'\\x%02x'" % int(value)
+        elif kind == "float":
+            text = repr(float(value))
+        else:
+            text = str(int(value))
+
+        lines = test.split("\n")
+        (line, match) = self.findLiterals(test)[literalIndex]
+        lines[line] = lines[line][:match.start(1)] + text + lines[line][match.end(1):]
+        return "\n".join(lines)
+
+    # Find literal matches in a test, as (line number, match) pairs
+    def findLiterals(self, test):
+        matches = []
+        lines = test.split("\n")
+        for line in range(1, len(lines)):
+            if lines[line].strip().startswith("//"):
+                continue
+            for match in self.literalPattern.finditer(lines[line]):
+                matches.append((line, match))
+        return matches
+
+    # Replace a random literal of a test with a nearby value
+    def mutateLiteral(self, test):
+        literals = self.getLiterals(test)
+        literalIndex = random.randint(0, len(literals) - 1)
+        (value, kind) = literals[literalIndex]
+
+        if kind == "float":
+            value = value + random.gauss(0, max(1.0, abs(value) * 0.1))
+        elif kind == "char":
+            value = min(255, max(0, value + random.randint(-10, 10)))
+        else:
+            value = value + int(random.gauss(0, max(1, abs(value) * 0.1)))
+
+        return self.setLiteral(test, literalIndex, value, kind)
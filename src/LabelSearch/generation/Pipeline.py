@@ -0,0 +1,187 @@
+# Gregory Gay (greg@greggay.com)
+# Evaluation pipeline that overlaps suite generation, compilation, and execution.
+# Suites pass through four stages, connected by bounded queues:
+# generate (build and write the suite), compile, execute, and score.
+# Compilation and execution run gcc and the suites as subprocesses, so their threads spend most of their time
+# waiting, and several of each can run while the next suites are being generated.
+# Generation and scoring each run on a single thread, so suites are generated in the same order, with the
+# same random choices, as when they are evaluated one at a time.
+# Suites with crashing or hanging tests are verified and re-run in the scoring stage, as they would be otherwise.
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import sys
+import random
+import threading
+from Queue import Queue
+
+class Pipeline():
+
+    # Generator used to build suites, and to verify and run the suites that fail in the pipeline
+    generator = None
+    # Number of threads compiling suites
+    compileWorkers = 2
+    # Number of threads executing suites
+    executeWorkers = 2
+    # Maximum number of suites waiting between two stages. If 0, twice the number of threads of the next stage.
+    queueSize = 0
+    # Guards the test cache, which is read by the generate stage and updated by the scoring stage
+    cacheLock = None
+
+    def __init__(self, generator, compileWorkers = 2, executeWorkers = 2):
+        self.generator = generator
+        self.compileWorkers = compileWorkers
+        self.executeWorkers = executeWorkers
+        self.cacheLock = threading.Lock()
+
+    # Generate and score a suite per output file.
+    # If seeds are given, the random generator is seeded with the seed of each suite before generating it.
+    def generate(self, outFiles, seeds = None):
+        return self.process(self.buildTests(outFiles, seeds))
+
+    # Build suites from existing test code, and score them
+    def evaluate(self, testSets, outFiles):
+        return self.process(zip(outFiles, testSets))
+
+    # Build the tests of each suite as the generate stage asks for them
+    def buildTests(self, outFiles, seeds):
+        for index in range(0, len(outFiles)):
+            if seeds != None:
+                random.seed(seeds[index])
+            yield (outFiles[index], self.generator.buildSuite())
+
+    # Run the suites through the pipeline. Returns the scored suites, in order.
+    def process(self, sources):
+        generator = self.generator
+        if generator.getFunctions()==[] or generator.getStateVariables()==[] or generator.getDependencyMap()==[]:
+            generator.initializeProgramData()
+        generator.shareSettings()
+
+        compileQueue = Queue(self.getQueueSize(self.compileWorkers))
+        executeQueue = Queue(self.getQueueSize(self.executeWorkers))
+        scoreQueue = Queue()
+        results = {}
+
+        threads = []
+        for worker in range(0, self.compileWorkers):
+            threads.append(threading.Thread(target = self.runStage, args = (self.compileSuite, compileQueue, executeQueue)))
+        for worker in range(0, self.executeWorkers):
+            threads.append(threading.Thread(target = self.runStage, args = (self.executeSuite, executeQueue, scoreQueue)))
+        scorer = threading.Thread(target = self.scoreSuites, args = (scoreQueue, results))
+        for thread in threads + [scorer]:
+            thread.daemon = True
+            thread.start()
+
+        # Generate stage. Runs on the calling thread, and blocks while the compile queue is full.
+        count = 0
+        try:
+            for (outFile, tests) in sources:
+                job = self.buildJob(count, outFile, tests)
+                count += 1
+                if job["done"]:
+                    scoreQueue.put(job)
+                else:
+                    compileQueue.put(job)
+        finally:
+            # Each stage is shut down once the one before it has finished
+            for worker in range(0, self.compileWorkers):
+                compileQueue.put(None)
+            for thread in threads[:self.compileWorkers]:
+                thread.join()
+            for worker in range(0, self.executeWorkers):
+                executeQueue.put(None)
+            for thread in threads[self.compileWorkers:]:
+                thread.join()
+            scoreQueue.put(None)
+            scorer.join()
+
+        if "error" in results:
+            raise results["error"][0], results["error"][1], results["error"][2]
+        return [results[index] for index in range(0, count)]
+
+    # Build and write a suite. Suites that are fully cached, or that the harness can evaluate, need no further work.
+    def buildJob(self, index, outFile, tests):
+        generator = self.generator
+        suite = generator.buildSuiteFromTests(tests, outFile)
+        job = {"index": index, "suite": suite, "cached": {}, "done": False, "directory": "", "error": ""}
+        if generator.testCache != None:
+            with self.cacheLock:
+                job["cached"] = generator.lookupCachedTests(suite)
+            if len(job["cached"]) == len(suite.getTests()):
+                job["done"] = True
+                return job
+
+        suite.writeSuiteFile()
+        if generator.harness != None and generator.harness.run(suite):
+            job["done"] = True
+        return job
+
+    # Take jobs from one queue, process them, and pass them on to the next, until a None job arrives.
+    # A job that raises an exception is passed on with the exception, and is not processed further.
+    def runStage(self, stage, inQueue, outQueue):
+        while True:
+            job = inQueue.get()
+            if job == None:
+                return
+            if "exception" not in job:
+                try:
+                    stage(job)
+                except Exception:
+                    job["exception"] = sys.exc_info()
+            outQueue.put(job)
+
+    # Compile stage. Suites that do not compile are passed on without an executable, and are handled by the scoring stage.
+    def compileSuite(self, job):
+        if job["done"]:
+            return
+        job["directory"] = self.generator.workspace.create()
+        job["executable"] = os.path.join(job["directory"], "suite")
+        self.generator.runner.buildExecutable(job["suite"].getFileName(), job["executable"])
+
+    # Execute stage
+    def executeSuite(self, job):
+        if job["done"] or not os.path.isfile(job["executable"]):
+            return
+        job["scoreFile"] = os.path.join(job["directory"], job["suite"].getScoreFileName())
+        (output, error, code) = self.generator.runner.executeSuite(job["executable"], job["suite"], job["scoreFile"])
+        job["error"] = error
+        job["ran"] = True
+
+    # Scoring stage. Imports scores, falls back to verifying and re-running suites that failed, and merges cached scores.
+    # Runs on a single thread, as it shares the test cache, verifier, and runner of the generator.
+    def scoreSuites(self, scoreQueue, results):
+        runner = self.generator.runner
+        while True:
+            job = scoreQueue.get()
+            if job == None:
+                return
+            if "error" in results:
+                # Remaining jobs are drained, so the other stages can finish
+                self.generator.workspace.remove(job["directory"])
+                continue
+
+            try:
+                if "exception" in job:
+                    raise job["exception"][0], job["exception"][1], job["exception"][2]
+                suite = job["suite"]
+                if not job["done"]:
+                    if job.get("ran", False) and not runner.hasFailingTests(job["error"]) and "Suite timed out" not in job["error"] and os.path.isfile(job["scoreFile"]):
+                        suite.importObligations(job["scoreFile"])
+                    else:
+                        self.generator.verifyAndRun(suite)
+                if self.generator.testCache != None:
+                    with self.cacheLock:
+                        self.generator.mergeCachedTests(suite, job["cached"])
+                results[job["index"]] = suite
+            except Exception:
+                results["error"] = sys.exc_info()
+            self.generator.workspace.remove(job["directory"])
+
+    # Bound on the number of suites waiting for a stage
+    def getQueueSize(self, workers):
+        if self.queueSize > 0:
+            return self.queueSize
+        return 2 * workers
@@ -0,0 +1,132 @@
+# Gregory Gay (greg@greggay.com)
+# Compiles the instrumented program once into an object file, and generates a header
+# that makes its functions and global variables reachable from separately-compiled suites.
+# Suites then only compile their own test code and link against the object file.
+
+# Command line options:
+# -p <instrumented program>
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import getopt
+import sys
+import os
+import copy
+from subprocess import Popen, PIPE
+from pycparser import parse_file, c_ast, c_generator
+
+class ProgramBuilder():
+
+    # Program to build
+    program = ""
+    # Generator to get C code from a node
+    generator = c_generator.CGenerator()
+    # Cache of compiled objects. If set, the program is only compiled when it changes.
+    compileCache = None
+
+    # Build the header and object file. Returns (header filename, object filename).
+    def build(self):
+        if self.program == "":
+            raise Exception("No program set for building.")
+
+        base = self.program[:self.program.index(".c")]
+        headerFile = base + ".h"
+        objectFile = base + ".o"
+
+        self.writeHeader(headerFile)
+
+        if self.compileCache != None:
+            (cOutput, cError) = self.compileCache.compile(self.program, objectFile, "-c")
+        else:
+            compileProcess = Popen("gcc -c " + self.program + " -o " + objectFile, stdout = PIPE, stderr = PIPE, shell = True)
+            (cOutput, cError) = compileProcess.communicate()
+        if not os.path.isfile(objectFile):
+            raise Exception("Program failed to compile: " + cError)
+
+        return (headerFile, objectFile)
+
+    # Write a header declaring everything a suite can reference in the program
+    def writeHeader(self, headerFile):
+        guard = "LABELSEARCH_" + os.path.basename(headerFile).replace(".", "_").upper()
+        code = []
+        code.append("// Generated by LabelSearch. Declarations for " + os.path.basename(self.program) + "\n")
+        code.append("#ifndef " + guard + "\n#define " + guard + "\n\n")
+
+        # Includes used by the program are needed by its declarations as well
+        source = open(self.program, "r")
+        for line in source:
+            if line.strip().startswith("#include"):
+                code.append(line.strip() + "\n")
+        source.close()
+        code.append("\n")
+
+        ast = parse_file(self.program, use_cpp=True, cpp_path = "gcc", cpp_args=['-E',r'-Iutils/fake_libc_include'])
+        for node in ast.ext:
+            # Skip declarations pulled in from included headers
+            if node.coord == None or node.coord.file != self.program:
+                continue
+
+            declaration = self.buildDeclaration(node)
+            if declaration != "":
+                code.append(declaration + ";\n")
+
+        code.append("\n#endif\n")
+
+        where = open(headerFile, "w")
+        for line in code:
+            where.write(line)
+        where.close()
+
+    # Build the header declaration for a top-level node. Returns an empty string if the node should not be exported.
+    def buildDeclaration(self, node):
+        if type(node) is c_ast.Typedef:
+            return self.generator.visit(node)
+        elif type(node) is c_ast.FuncDef:
+            # Static functions cannot be linked against
+            if "static" in node.decl.storage:
+                return ""
+            return self.generator.visit(node.decl)
+        elif type(node) is c_ast.Decl:
+            if "static" in node.storage:
+                return ""
+            if node.name == None or type(node.type) is c_ast.FuncDecl:
+                # Struct, union, or enum definition, or a prototype
+                return self.generator.visit(node)
+
+            # Global variable - declare as extern, without its initial value
+            decl = copy.copy(node)
+            decl.init = None
+            if "extern" not in decl.storage:
+                decl.storage = ["extern"] + decl.storage
+            return self.generator.visit(decl)
+
+        return ""
+
+def main(argv):
+    builder = ProgramBuilder()
+    program = ""
+
+    try:
+        opts, args = getopt.getopt(argv,"hp:")
+    except getopt.GetoptError:
+        print 'ProgramBuilder.py -p <program name>'
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt == "-h":
+            print 'ProgramBuilder.py -p <program name>'
+            sys.exit()
+        elif opt == "-p":
+            program = arg
+
+    if program == "":
+        raise Exception('No program specified')
+    else:
+        builder.program = program
+        print builder.build()
+
+# Call into main
+if __name__ == '__main__':
+    main(sys.argv[1:])
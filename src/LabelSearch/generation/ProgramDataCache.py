@@ -0,0 +1,96 @@
+# Gregory Gay (greg@greggay.com)
+# On-disk cache of the program data gathered by the generator.
+# Maps a hash of the program, the files it includes, and the include path used to preprocess it
+# to the functions, state variables, type definitions, structs, unions, enums, and dependency map of the program.
+# Later runs on the same program then skip preprocessing, parsing, and building the dependency map.
+# Entries are files named by their key, so several processes can share a cache directory.
+# The format version is part of the key, so entries written by an older version are never read.
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import re
+import hashlib
+import tempfile
+import cPickle
+
+class ProgramDataCache():
+
+    # Version of the cached data. Increase it whenever the program data or dependency map change form,
+    # or are gathered differently from the same program.
+    version = 3
+    # Directory holding the cached entries
+    directory = ""
+    # Number of lookups answered from the cache
+    hits = 0
+    # Number of lookups that found no entry
+    misses = 0
+    # Quoted includes, whose contents are part of the key
+    includePattern = re.compile(r"^\s*#include\s+\"([^\"]+)\"", re.MULTILINE)
+
+    def __init__(self, directory = ""):
+        if directory == "":
+            directory = os.path.join("/dev/shm" if os.access("/dev/shm", os.W_OK) else tempfile.gettempdir(), "labelsearch_program_cache")
+        self.directory = directory
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # Another process created it first
+                pass
+
+    # Build the cache key for a program, preprocessed with the given include directories
+    def getKey(self, program, includePath):
+        source = open(program, "rb")
+        text = source.read()
+        source.close()
+
+        key = hashlib.sha1("version " + str(self.version) + "\n" + text)
+        # Relative include directories depend on the directory the search runs in
+        for directory in includePath:
+            key.update("\n" + os.path.abspath(directory))
+        for include in self.includePattern.findall(text):
+            fileName = os.path.join(os.path.dirname(program), include)
+            if os.path.isfile(fileName):
+                included = open(fileName, "rb")
+                key.update("\n" + hashlib.sha1(included.read()).hexdigest())
+                included.close()
+            else:
+                key.update("\nmissing " + include)
+
+        return key.hexdigest()
+
+    # Get the cached program data. Returns a dictionary of the data, or None if not cached.
+    def lookup(self, program, includePath):
+        try:
+            entry = open(os.path.join(self.directory, self.getKey(program, includePath)), "rb")
+            data = cPickle.load(entry)
+            entry.close()
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+        if data.get("version") != self.version:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    # Store the program data, given as a dictionary
+    def store(self, program, includePath, data):
+        data = dict(data)
+        data["version"] = self.version
+
+        # Entries are written to a temporary file, then renamed, so other processes never read a partial entry
+        (handle, staging) = tempfile.mkstemp(prefix = ".", dir = self.directory)
+        entry = os.fdopen(handle, "wb")
+        cPickle.dump(data, entry, cPickle.HIGHEST_PROTOCOL)
+        entry.close()
+        os.rename(staging, os.path.join(self.directory, self.getKey(program, includePath)))
+
+    # Summary of cache use, for reporting
+    def getStatistics(self):
+        return "Program data cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses"
@@ -3,6 +3,7 @@
 
 # Command line options:
 # -s <test suite filename>
+# -b <prebuilt object file of the program, if the suite was built against one>
 
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
@@ -11,13 +12,24 @@
 import getopt
 import sys
 import os
+import re
 from subprocess import Popen, call, PIPE, STDOUT
 from ..structures.TestSuite import TestSuite
 from Verifier import Verifier
+from Timeouts import Timeouts
+from Workspace import Workspace
 
 class Runner(): 
     # Test suite, in processable form
     suite = TestSuite()
+    # Prebuilt object file of the program under test. If set, suites are linked against it.
+    objectFile = ""
+    # Time limits on execution
+    timeouts = Timeouts()
+    # Scratch directories for the executable and score file
+    workspace = Workspace()
+    # Cache of compiled suites. If set, identical suites are only compiled once.
+    compileCache = None
 
     # Imports a suite from a file and executes it
     def runImport(self,fileName):
@@ -31,46 +43,104 @@ class Runner():
     # Execute a suite already in-memory
     def run(self):
         # Compile and attempt to run the suite.
-        (output, error) = self.compileSuite()
+        directory = self.workspace.create()
+        (output, error) = self.compileSuite(directory)
 
         # If an executable is produced, compilation succeeded.                    
-        if "Segmentation fault" in error:
+        if self.hasFailingTests(error):
             # If there is a segmentation fault, perform verification and re-run.
             #print error
             print "Performing Verification"
+            self.workspace.remove(directory)
             
             verifier = Verifier()
             verifier.suite = self.suite
+            verifier.objectFile = self.objectFile
+            verifier.timeouts = self.timeouts
+            verifier.workspace = self.workspace
+            verifier.compileCache = self.compileCache
             verifier.verify(self.suite.getFileName())
             print "Attempting to rerun."
             self.suite.importSuite()
             self.run()  
         else:
             # If it ran sucessfully, import the obligation scores and recalculate the suite score.
-            self.suite.importObligations(os.path.basename(self.suite.getFileName()) + "sv")
-            rmProcess = Popen("rm "+os.path.basename(self.suite.getFileName()) + "sv", stdout = PIPE, stderr = PIPE, shell = True)
-            (rOutput, eError) = rmProcess.communicate()
+            # If the suite was stopped, the scores of the tests that finished are kept.
+            if "Suite timed out" in error:
+                print "Suite timed out"
+            scoreFile = os.path.join(directory, self.suite.getScoreFileName())
+            if not os.path.isfile(scoreFile):
+                # Suites written before score files were placed in the workspace write them to the current directory
+                scoreFile = self.suite.getScoreFileName()
+            self.suite.importObligations(scoreFile)
+            self.workspace.removeFiles([scoreFile])
+            self.workspace.remove(directory)
 
             #print self.suite.getObligations()
             #print self.suite.getScore()
 
-    # Compiles and runs suite
-    def compileSuite(self):
+    # Compiles a batch of suites into a single executable, then runs and scores each suite from it.
+    # Returns the suites that crashed or timed out, which need to be verified and run on their own.
+    def runBatch(self, suites, batchFile):
+        directory = self.workspace.create()
+        executable = os.path.join(directory, "batch")
+        self.buildExecutable(batchFile, executable)
+
+        if not os.path.isfile(executable):
+            # Each suite is compiled on its own instead
+            self.workspace.remove(directory)
+            return suites
+
+        failed = []
+        for index in range(0, len(suites)):
+            suite = suites[index]
+            scoreFile = os.path.join(directory, suite.getScoreFileName())
+            (output, error, code) = self.executeSuite(executable, suite, scoreFile, index)
+            if self.hasFailingTests(error) or "Suite timed out" in error or not os.path.isfile(scoreFile):
+                failed.append(suite)
+            else:
+                suite.importObligations(scoreFile)
+            self.workspace.removeFiles([scoreFile])
+
+        self.workspace.remove(directory)
+        return failed
+
+    # Compile a source file against the program object. Returns the compiler messages.
+    def buildExecutable(self, fileName, executable):
+        if self.compileCache != None:
+            (cOutput, cError) = self.compileCache.compile(fileName, executable, self.objectFile)
+        else:
+            compileProcess = Popen("gcc " + fileName + " " + self.objectFile + " -o " + executable, stdout = PIPE, stderr = PIPE, shell=True)
+            (cOutput, cError) = compileProcess.communicate()
+        return cError
+
+    # Run a compiled suite, which writes its scores to the score file. Returns (output, error, return code).
+    # Batch executables are also given the index of the suite to run.
+    # The mask is quoted, as suites left with no tests have an empty mask, which would otherwise shift the arguments after it.
+    def executeSuite(self, executable, suite, scoreFile, index = None):
+        command = executable
+        if index != None:
+            command += " " + str(index)
+        return self.timeouts.execute(command + " '" + suite.getTestMask() + "' " + str(self.timeouts.getTestLimitMillis()) + " " + scoreFile)
+
+    # Did any test crash or exceed the time limit?
+    def hasFailingTests(self, error):
+        return "Segmentation fault" in error or re.search(r"Test \d+ (crashed|timed out)", error) != None
+
+    # Compiles and runs suite. The executable and score file are written to the workspace directory.
+    def compileSuite(self, directory):
         fileName = self.suite.getFileName()
         if os.path.isfile(fileName):
-            path = os.path.dirname(fileName)
-            rmProcess = Popen("rm a.out", stdout = PIPE, stderr = PIPE, shell = True)
-            (rOutput, eError) = rmProcess.communicate()
-            compileProcess = Popen("gcc " + fileName, stdout = PIPE, stderr = PIPE, shell=True)
-            (cOutput, cError) = compileProcess.communicate()
+            executable = os.path.join(directory, "suite")
+            cError = self.buildExecutable(fileName, executable)
             
-            if os.path.isfile("a.out"):
+            if os.path.isfile(executable):
                 # Does it execute without segmentation faults?
-                process = Popen("./a.out", stdout = PIPE, stderr = PIPE, shell=True)
-                (output, error) = process.communicate()
-                call("rm a.out", shell=True)
+                (output, error, code) = self.executeSuite(executable, self.suite, os.path.join(directory, self.suite.getScoreFileName()))
+                self.workspace.removeFiles([executable])
                 return (output, error)
             else:
+                self.workspace.remove(directory)
                 raise Exception("Suite failed to compile: " + cError)
         else:
             raise Exception("The suite file does not exist.")
@@ -80,20 +150,22 @@ def main(argv):
     fileName = ""
 
     try:
-        opts, args = getopt.getopt(argv,"hs:")
+        opts, args = getopt.getopt(argv,"hs:b:")
     except getopt.GetoptError:
-        print 'Runner.py -s <test suite filename>'
+        print 'Runner.py -s <test suite filename> -b <prebuilt program object>'
       	sys.exit(2)
   		
     for opt, arg in opts:
         if opt == "-h":
-            print 'Runner.py -s <test suite filename>'
+            print 'Runner.py -s <test suite filename> -b <prebuilt program object>'
             sys.exit()
       	elif opt == "-s":
             if arg == "":
                 raise Exception('No filename specified')
             else:
                fileName = arg
+        elif opt == "-b":
+            runner.objectFile = arg
 
     if fileName == "":
         raise Exception('No suite filename specified')
@@ -0,0 +1,93 @@
+# Gregory Gay (greg@greggay.com)
+# Time limits on suite and test execution.
+# The test limit is passed to the runner, which stops any test that exceeds it and reports it as timed out.
+# The suite limit is enforced here. Suites run in their own process group, so that a suite
+# that exceeds its limit is killed along with any test processes it has started.
+# Keeps count of the suites and tests that were stopped, and of the time lost to them.
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import re
+import signal
+import time
+import threading
+from threading import Timer
+from subprocess import Popen, PIPE
+
+class Timeouts():
+
+    # Seconds a single test may run before it is stopped. If 0, tests are not limited.
+    testLimit = 0
+    # Seconds a whole suite may run before it is stopped. If 0, suites are not limited.
+    suiteLimit = 0
+    # Number of suites stopped for exceeding the suite limit
+    suiteTimeouts = 0
+    # Number of tests stopped for exceeding the test limit
+    testTimeouts = 0
+    # Seconds spent on executions that were stopped
+    timeLost = 0.0
+    # Guards the counts, as suites may be executed on several threads
+    lock = threading.Lock()
+
+    # Run a command, stopping it if it exceeds the suite limit. Returns (output, error, return code).
+    # If the command is stopped, a message saying so is added to the error output.
+    def execute(self, command, stdin = None):
+        startTime = time.time()
+        process = Popen(command, stdin = PIPE, stdout = PIPE, stderr = PIPE, shell = isinstance(command, str), preexec_fn = os.setsid)
+        timer = self.watch(process)
+        (output, error) = process.communicate(stdin)
+        self.stopWatching(timer)
+
+        self.recordTestTimeouts(error)
+        if self.hasTimedOut(process):
+            with self.lock:
+                self.suiteTimeouts += 1
+                self.timeLost += time.time() - startTime
+            error = error + "Suite timed out after " + str(self.suiteLimit) + " seconds\n"
+
+        return (output, error, process.returncode)
+
+    # Start a timer that kills the process group of a process once the suite limit is exceeded.
+    # Returns the timer, or None if suites are not limited.
+    def watch(self, process):
+        if self.suiteLimit <= 0:
+            return None
+        timer = Timer(self.suiteLimit, self.kill, [process])
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    # Stop a timer started by watch
+    def stopWatching(self, timer):
+        if timer != None:
+            timer.cancel()
+
+    # Kill a process and the processes it started
+    def kill(self, process):
+        process.timedOut = True
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    # Was a process killed for exceeding the suite limit?
+    def hasTimedOut(self, process):
+        return getattr(process, "timedOut", False)
+
+    # Count the tests that the runner reported as timed out
+    def recordTestTimeouts(self, error):
+        stopped = len(re.findall(r"Test \d+ timed out", error))
+        with self.lock:
+            self.testTimeouts += stopped
+            self.timeLost += stopped * self.testLimit
+
+    # Test limit in milliseconds, as passed to the runner and harness
+    def getTestLimitMillis(self):
+        return int(self.testLimit * 1000)
+
+    # Summary of time lost, for reporting
+    def getStatistics(self):
+        return "Timeouts: " + str(self.suiteTimeouts) + " suites, " + str(self.testTimeouts) + " tests, " + str(round(self.timeLost, 2)) + " seconds lost"
@@ -1,9 +1,13 @@
 # Gregory Gay (greg@greggay.com)
 # Verifies that generated suites run without segmentation faults.
 # Tests that cause segmentation faults are commented-out, but left in, as they often indicate faults.
+# Tests that exceed the time limit are separated in the same way.
+# The runner executes each test in its own process and reports the tests that crash, so a single
+# compilation and execution is enough to find them.
 
 # Command line options:
 # -s <test suite filename>
+# -b <prebuilt object file of the program, if the suite was built against one>
 # -o <output filename, if different from suite filename>
 
 # This Source Code Form is subject to the terms of the Mozilla Public
@@ -13,13 +17,24 @@
 import getopt
 import sys
 import os
+import re
 from subprocess import Popen, call, PIPE, STDOUT
 from ..structures.TestSuite import TestSuite
 import copy
+from Timeouts import Timeouts
+from Workspace import Workspace
 
 class Verifier(): 
     # Test suite, in processable form
     suite = TestSuite()
+    # Prebuilt object file of the program under test. If set, suites are linked against it.
+    objectFile = ""
+    # Time limits on execution
+    timeouts = Timeouts()
+    # Scratch directories for the executable and score file
+    workspace = Workspace()
+    # Cache of compiled suites. If set, identical suites are only compiled once.
+    compileCache = None
     
     # Imports a suite from a file and performs verification
     def verifyImport(self,fileName,outFile):
@@ -33,6 +48,7 @@ class Verifier():
     # Performs verification on a suite already in-memory
     def verify(self, outFile):
         badTests = []
+        hungTests = []
         # Compile and attempt to run the suite.
         (output, error) = self.compileSuite(self.suite.getFileName())
 
@@ -40,7 +56,16 @@ class Verifier():
             self.suite.setFileName(outFile)
 
         # If an executable is produced, compilation succeeded.                    
-        if "Segmentation fault" in error:
+        if "Segmentation fault" in error or "Suite timed out" in error or re.search(r"Test \d+ (crashed|timed out)", error):
+            # The runner executes each test in its own process, and reports the tests that crash or hang.
+            crashedTests = self.getReportedTests(error, "crashed: ")
+            hungTests = self.getReportedTests(error, "timed out")
+            if crashedTests != [] or hungTests != []:
+                self.separateFailingTests(crashedTests, hungTests)
+                self.suite.writeSuiteFile()
+                return
+
+            # Suites with runners that do not isolate tests are checked one test at a time.
             #print error
             print "Attempting to find source(s) of segmentation faults"
 
@@ -71,7 +96,10 @@ class Verifier():
                 if error != "":
                     #print error
                     testList = self.suite.getTestList()
-                    badTests.append(testNum)
+                    if "timed out" in error:
+                        hungTests.append(testNum)
+                    else:
+                        badTests.append(testNum)
                     testList[testNum] = 0
                     self.suite.setTestList(testList)
 
@@ -82,24 +110,52 @@ class Verifier():
                 raise Exception("Unable to verify.")
             else:
                 # Remove bad tests
-                print "Separating failing tests: "+str(badTests)
-                self.removeBadTests(badTests) 
+                self.separateFailingTests(badTests, hungTests)
+                # Rewrite the suite, so that the file matches the tests kept in memory
+                self.suite.writeSuiteFile()
         else:
             # Print test suite to file
             self.suite.writeSuiteFile()
 
+    # Get the indices of the tests that the runner reported with a message, e.g., "crashed: " or "timed out"
+    def getReportedTests(self, error, message):
+        reported = []
+        for testNum in re.findall(r"Test (\d+) " + message, error):
+            if int(testNum) - 1 not in reported:
+                reported.append(int(testNum) - 1)
+        reported.sort()
+        return reported
+
+    # Separate crashing tests into failing_tests/seg_fault.c, and hanging tests into failing_tests/timeout.c
+    def separateFailingTests(self, crashedTests, hungTests):
+        if crashedTests != []:
+            print "Separating failing tests: "+str(crashedTests)
+            self.removeBadTests(crashedTests)
+
+        if hungTests != []:
+            # Removing the crashing tests shifts the positions of the tests after them
+            shifted = []
+            for testNum in hungTests:
+                earlier = 0
+                for crashed in crashedTests:
+                    if crashed < testNum:
+                        earlier += 1
+                shifted.append(testNum - earlier)
+            print "Separating hanging tests: "+str(hungTests)
+            self.removeBadTests(shifted, "timeout.c")
+
     # Separate bad tests from suite
-    def removeBadTests(self, badTests):
+    def removeBadTests(self, badTests, failingFile = "seg_fault.c"):
         # Create failing tests directory
-        path = os.path.dirname(self.suite.getFileName())+"/failing_tests/"
+        path = os.path.join(os.path.dirname(self.suite.getFileName()), "failing_tests") + "/"
         if not os.path.isdir(path):
             os.makedirs(path)
 
         # Create test suite
         failingSuite = TestSuite()
-        failingSuite.setFileName(path+"seg_fault.c")
+        failingSuite.setFileName(path+failingFile)
 
-        if os.path.exists(path+"seg_fault.c"):
+        if os.path.exists(path+failingFile):
             # Import existing failing tests
             failingSuite.importSuite()
 
@@ -112,7 +168,7 @@ class Verifier():
             fTestList.append(0)
             fTests.append(gTests[badTests[entry]-entry])
             del gTests[badTests[entry]-entry]
-            gTestList.remove(0)
+            del gTestList[badTests[entry]-entry]
 
         # Fix test numbering
         for entry in range(1,len(fTests)+1):
@@ -166,38 +222,38 @@ class Verifier():
             lastTest = fCode[len(fCode)-2]
             
             if "runner" not in lastTest:
-                lastTest = lastTest.split("test")[1]
-                lastTest = int(lastTest[:lastTest.index("(")])
+                lastTest = int(re.search(r"test(\d+)", lastTest).group(1))
             else:
                 lastTest = 0
 
 
             del fCode[len(fCode)-1]
             for entry in range(lastTest + 1,len(fTestList)):
-                fCode.append("    if(tests[" + str(entry) + "] == 1)\n")
-                fCode.append("        test" + str(entry) + "();\n")
+                fCode.extend(failingSuite.getRunnerEntry(entry))
 
             fCode.append(lastLine)     
 
         failingSuite.setSuiteCode(fCode)
         failingSuite.writeSuiteFile()
 
-    # Compiles and runs suite
+    # Compiles and runs suite. Artifacts are written to a workspace directory that is removed afterwards.
     def compileSuite(self, fileName):
         if os.path.isfile(fileName):
-            path = os.path.dirname(fileName)
-            rmProcess = Popen("rm a.out", stdout = PIPE, stderr = PIPE, shell = True)
-            (rOutput, eError) = rmProcess.communicate()
-            compileProcess = Popen("gcc " + fileName, stdout = PIPE, stderr = PIPE, shell=True)
-            (cOutput, cError) = compileProcess.communicate()
+            directory = self.workspace.create()
+            executable = os.path.join(directory, "suite")
+            if self.compileCache != None:
+                (cOutput, cError) = self.compileCache.compile(fileName, executable, self.objectFile)
+            else:
+                compileProcess = Popen("gcc " + fileName + " " + self.objectFile + " -o " + executable, stdout = PIPE, stderr = PIPE, shell=True)
+                (cOutput, cError) = compileProcess.communicate()
             
-            if os.path.isfile("a.out"):
-                # Does it execute without segmentation faults?
-                process = Popen("./a.out", stdout = PIPE, stderr = PIPE, shell=True)
-                (output, error) = process.communicate()
-                call("rm a.out", shell=True)
+            if os.path.isfile(executable):
+                # Does it execute without segmentation faults? The mask is quoted, as it is empty for suites with no tests.
+                (output, error, code) = self.timeouts.execute(executable + " '" + self.suite.getTestMask() + "' " + str(self.timeouts.getTestLimitMillis()) + " " + os.path.join(directory, self.suite.getScoreFileName()))
+                self.workspace.remove(directory)
                 return (output, error)
             else:
+                self.workspace.remove(directory)
                 raise Exception("Suite failed to compile: " + cError)
         else:
             raise Exception("The suite file does not exist.")
@@ -208,14 +264,14 @@ def main(argv):
     outFile = ""
 
     try:
-        opts, args = getopt.getopt(argv,"hs:o:")
+        opts, args = getopt.getopt(argv,"hs:o:b:")
     except getopt.GetoptError:
-        print 'Verifier.py -s <test suite filename> -o <output filename>'
+        print 'Verifier.py -s <test suite filename> -o <output filename> -b <prebuilt program object>'
       	sys.exit(2)
   		
     for opt, arg in opts:
         if opt == "-h":
-            print 'Verifier.py -s <test suite filename> -o <output filename>'
+            print 'Verifier.py -s <test suite filename> -o <output filename> -b <prebuilt program object>'
             sys.exit()
       	elif opt == "-s":
             if arg == "":
@@ -224,6 +280,8 @@ def main(argv):
                fileName = arg
         elif opt == "-o":
             outFile = arg
+        elif opt == "-b":
+            verifier.objectFile = arg
 
     if outFile == "":
         outFile = fileName
@@ -0,0 +1,53 @@
+# Gregory Gay (greg@greggay.com)
+# Scratch workspaces for compile and run artifacts.
+# Each evaluation gets its own uniquely-named directory, so executables and score files
+# from concurrent evaluations (or concurrent searches in the same directory) never collide.
+# Workspaces are created on /dev/shm where available, so artifacts never touch the disk.
+# Artifacts are removed directly, without starting a shell, unless they are kept for debugging.
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import shutil
+import tempfile
+
+class Workspace():
+
+    # Directory that workspaces are created in. If empty, /dev/shm is used where available,
+    # and the system temporary directory otherwise.
+    root = ""
+    # If 1, workspaces are left in place after use, for debugging
+    keep = 0
+    # Prefix of workspace directory names
+    prefix = "labelsearch_"
+
+    # Create a new, empty workspace directory. Returns its path.
+    def create(self):
+        return tempfile.mkdtemp(prefix = self.prefix + str(os.getpid()) + "_", dir = self.getRoot())
+
+    # Remove a workspace directory and everything in it
+    def remove(self, directory):
+        if self.keep == 1 or directory == "":
+            return
+        shutil.rmtree(directory, ignore_errors = True)
+
+    # Remove a list of files, ignoring any that do not exist
+    def removeFiles(self, files):
+        if self.keep == 1:
+            return
+        for fileName in files:
+            try:
+                os.remove(fileName)
+            except OSError:
+                pass
+
+    # Directory that workspaces are created in
+    def getRoot(self):
+        if self.root == "":
+            if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+                self.root = "/dev/shm"
+            else:
+                self.root = tempfile.gettempdir()
+        return self.root
@@ -1,4 +1,10 @@
 #include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <signal.h>
+#include <sys/time.h>
+#include <sys/wait.h>
 #include "tcas_labels_instrumented.c"
 
 // Array indexing test entries.
@@ -6,9 +12,9 @@
 // tests[1] corresponds to test001(), etc.
 int tests[3]={2,1,1};
 
-// Flag for printing obligation scores to a CSV file at the end of execution.
+// Flag for writing raw obligation scores to a file.
 int print = 1;
-char* fileName = "test.csv";
+char* fileName = "test.obs";
 
 // Flag for printing obligation scores to the screen at the end of execution.
 int screen = 1;
@@ -22,15 +28,23 @@ void printScoresToScreen(){
     }
 }
 
-// Prints obligation scores to a file
-void printScoresToFile(){
-    FILE *outFile = fopen(fileName,"w");
-    fprintf(outFile, "# Obligation, Score (Unnormalized)\n");
-    int obligation;
-    for(obligation=1; obligation<=obligations[0]; obligation++){
-        fprintf(outFile,"%d, %f\n",obligation,obligations[obligation]);
+// File that obligation scores are written to
+FILE *scoreFile = NULL;
+
+// Opens the score file, and writes the number of obligations
+void openScoreFile(){
+    if(scoreFile == NULL){
+        scoreFile = fopen(fileName,"wb");
+        fwrite(obligations, sizeof(float), 1, scoreFile);
+        fflush(scoreFile);
     }
-    fclose(outFile);
+}
+
+// Writes raw obligation scores to a file. The scores of each test are written as it runs.
+void printScoresToFile(){
+    openScoreFile();
+    fclose(scoreFile);
+    scoreFile = NULL;
 }
 
 // Resets obligation scores
@@ -42,6 +56,79 @@ void resetObligationScores(){
     }
 }
 
+// Scores of the suite before the current test
+float suiteScores[sizeof(obligations) / sizeof(float)];
+
+// Reads the enabled tests from a mask of 0s and 1s, one per test, overriding the test list.
+void readTestMask(char *mask){
+    int test;
+    for(test=1; test<=tests[0] && mask[test-1] != '\0'; test++){
+        tests[test] = (mask[test-1] == '1');
+    }
+}
+
+// Milliseconds a single test may run before it is stopped. If 0, tests are not limited.
+int testLimit = 0;
+
+// Runs a single test in a child process, and writes the scores that it achieved alone.
+// The child sends its scores back through a pipe. A test that crashes or exceeds the time limit
+// is reported on stderr, and does not affect the scores of the suite or the execution of the remaining tests.
+// Suite-level scores remain the minimum across all tests.
+void runTest(int testNum, void (*test)()){
+    int obligation;
+    int channel[2];
+    int status;
+    int received = 0;
+    int size = sizeof(float) * (int) obligations[0];
+    float row = testNum;
+    pid_t child;
+    memcpy(suiteScores, obligations, sizeof(obligations));
+    resetObligationScores();
+    fflush(stdout);
+    if(pipe(channel) != 0 || (child = fork()) < 0){
+        perror("Unable to start test");
+        exit(1);
+    }
+    if(child == 0){
+        close(channel[0]);
+        if(testLimit > 0){
+            struct itimerval timer = {{0, 0}, {testLimit / 1000, (testLimit % 1000) * 1000}};
+            setitimer(ITIMER_REAL, &timer, NULL);
+        }
+        test();
+        write(channel[1], obligations + 1, size);
+        fflush(stdout);
+        _exit(0);
+    }
+    close(channel[1]);
+    while(received < size){
+        int bytes = read(channel[0], ((char *) (obligations + 1)) + received, size - received);
+        if(bytes <= 0)
+            break;
+        received += bytes;
+    }
+    close(channel[0]);
+    waitpid(child, &status, 0);
+    if(WIFSIGNALED(status) || received < size){
+        if(WIFSIGNALED(status) && WTERMSIG(status) == SIGALRM)
+            fprintf(stderr, "Test %d timed out\n", testNum);
+        else if(WIFSIGNALED(status))
+            fprintf(stderr, "Test %d crashed: %s\n", testNum, strsignal(WTERMSIG(status)));
+        memcpy(obligations, suiteScores, sizeof(obligations));
+        return;
+    }
+    if(print == 1){
+        openScoreFile();
+        fwrite(&row, sizeof(float), 1, scoreFile);
+        fwrite(obligations + 1, sizeof(float), (int) obligations[0], scoreFile);
+        fflush(scoreFile);
+    }
+    for(obligation=1; obligation<=obligations[0]; obligation++){
+        if(suiteScores[obligation] < obligations[obligation])
+            obligations[obligation] = suiteScores[obligation];
+    }
+}
+
 // Test Cases
 void test001(){
     ALIM();
@@ -58,9 +145,9 @@ void test002(){
 // Top-level test runner.
 void runner(){
     if(tests[1] == 1)
-        test001();
+        runTest(1, test001);
     if(tests[2] == 1)
-        test002();
+        runTest(2, test002);
 
     if(screen == 1)
         printScoresToScreen();
@@ -68,7 +155,16 @@ void runner(){
         printScoresToFile();
 }
 
-int main(){
+int main(int argc, char *argv[]){
+    if(argc > 1)
+        readTestMask(argv[1]);
+    if(argc > 2)
+        testLimit = atoi(argv[2]);
+    if(argc > 3)
+        fileName = argv[3];
+    // The score file is opened up front, so scores of finished tests survive if the suite is stopped
+    if(print == 1)
+        openScoreFile();
     runner();
     return(0);
 }
@@ -12,6 +12,9 @@
 # -l <labels file, if non-standard name used, default= <program>.labels
 # -o <filename of instrumented version, optional, default = <program>_instrumented.c>
 # -k <constant used in score calculation, default = 1>
+# -c <number of compilations to cache on disk, default is 0 (no caching)>
+# -g <if 1, labels that are already covered skip their cost function, default = 0>
+# -i <if 1, cache instrumentation on disk, and re-instrument changed programs incrementally, default = 0>
 
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
@@ -22,14 +25,57 @@ import sys
 import os
 from PredicateTransformation import *
 from Verifier import Verifier
+from InstrumentationCache import InstrumentationCache
+from ..generation.CompileCache import CompileCache
 
 class Instrumentation(): 
 
     scoreEpsilon = 1.0
-    verifier = Verifier()
+    # Checks that labels compile
+    verifier = None
+    # If 1, each label first checks whether its obligation is covered, and skips the cost function if it is.
+    # The score of a covered obligation is 0, and cannot improve, so the scores are unchanged.
+    # The score is the covered flag, so anything that resets scores also makes labels evaluate again.
+    guardCovered = 0
+    # Cost functions already built, by predicate. Labels for MC/DC and similar criteria repeat predicates heavily.
+    costFunctions = None
+    # Cache of instrumentation results. If set, unchanged programs are not instrumented again,
+    # and only new predicates and labels are translated and checked.
+    instrumentationCache = None
+    # Names of the helpers added to instrumented programs. Test generation skips these functions.
+    helperNames = set(["pc_lt", "pc_le", "pc_eq", "pc_ne", "pc_and", "pc_or", "pc_record"])
+    # Helpers that cost functions are built from. Each takes distances that were already computed,
+    # so operands are evaluated once.
+    helperCode = """// Cost functions used by the instrumentation
+static inline double pc_lt(double difference){ return difference < 0 ? 0 : difference + scoreEpsilon; }
+static inline double pc_le(double difference){ return difference <= 0 ? 0 : difference + scoreEpsilon; }
+static inline double pc_eq(double distance){ return distance == 0 ? 0 : distance + scoreEpsilon; }
+static inline double pc_ne(double distance){ return distance != 0 ? 0 : scoreEpsilon; }
+static inline double pc_and(double lhs, double rhs){ return lhs + rhs; }
+static inline double pc_or(double lhs, double rhs){ return lhs < rhs ? lhs : rhs; }
+// Keeps the best score seen for an obligation
+static inline float pc_record(float score, double distance){ return distance < score ? distance : score; }"""
+
+    def __init__(self):
+        # Each instrumenter has its own verifier, as the caches it uses are set per instrumenter
+        self.verifier = Verifier()
+        self.costFunctions = {}
 
     # Central process of instrumentation
     def instrument(self,program,labelFile,outFile):
+        if self.instrumentationCache != None:
+            # Unchanged programs are copied from the cache
+            key = self.instrumentationCache.getProgramKey(program, labelFile, self.scoreEpsilon, self.guardCovered)
+            text = self.instrumentationCache.lookupProgram(key)
+            if text != None:
+                where = open(outFile, 'w')
+                where.write(text)
+                where.close()
+                print self.instrumentationCache.getStatistics()
+                return
+            self.costFunctions.update(self.instrumentationCache.lookupCostFunctions())
+            known = len(self.costFunctions)
+
         # Get number of obligations
         numObs=self.getNumObs(labelFile)
         
@@ -49,6 +95,7 @@ class Instrumentation():
                     obDeclaration+=", 1000000.0"
                 instrumented.append(obDeclaration+"};")
                 instrumented.append("float scoreEpsilon = "+str(self.scoreEpsilon)+";")
+                instrumented.append(self.helperCode)
                 instrumented.append(line)
 
             # Replace labels with scores
@@ -74,7 +121,20 @@ class Instrumentation():
 
         # Verify obligations to ensure that they compile. 
         # If they do not, comment them out and replace with dummy score.
-        self.verifier.verify(outFile, outFile)
+        compiles = self.verifier.verify(outFile, outFile)
+        if self.verifier.compileCache != None:
+            print self.verifier.compileCache.getStatistics()
+
+        if self.instrumentationCache != None:
+            self.instrumentationCache.translated += len(self.costFunctions) - known
+            if len(self.costFunctions) > known:
+                self.instrumentationCache.storeCostFunctions(self.costFunctions)
+            # Programs that do not compile are instrumented again, so their errors are reported
+            if compiles:
+                where = open(outFile, 'r')
+                self.instrumentationCache.storeProgram(key, where.read())
+                where.close()
+            print self.instrumentationCache.getStatistics()
 
     # Gets number of obligations from label file
     def getNumObs(self,labelFile):
@@ -99,15 +159,20 @@ class Instrumentation():
         words=adjustedLabel.strip().split(",")
         # Prepare new expression
         newLabel="obligations["+words[1]+"]="
-
-        # Break down predicate into cost function
-        lexer = Lexer(words[0])
-        parser = Parser(lexer)
-        interpreter = Interpreter(parser)
-        equation=interpreter.interpret()
+        # The guard is a conditional expression, so the label stays a single statement wherever it is placed
+        if self.guardCovered == 1:
+            newLabel=newLabel+"obligations["+words[1]+"] == 0 ? 0 : "
+
+        # Break down predicate into cost function. Each distinct predicate is only translated once.
+        if words[0] not in self.costFunctions:
+            lexer = Lexer(words[0])
+            parser = Parser(lexer)
+            interpreter = Interpreter(parser)
+            self.costFunctions[words[0]]=interpreter.interpret()
+        equation=self.costFunctions[words[0]]
         
-        # Check whether new score is better than existing score
-        newLabel=newLabel+"(("+equation+" < obligations["+words[1]+"]) ? "+equation+" : obligations["+words[1]+"]);"
+        # Keep the new score if it is better than the existing score. The equation is only evaluated once.
+        newLabel=newLabel+"pc_record(obligations["+words[1]+"], "+equation+");"
 
         return newLabel
 
@@ -124,22 +189,32 @@ class Instrumentation():
     def setScoreEpsilon(self,scoreEpsilon):
         self.scoreEpsilon = scoreEpsilon
 
+    # Set the cache of instrumentation results
+    def setInstrumentationCache(self,instrumentationCache):
+        self.instrumentationCache = instrumentationCache
+        self.verifier.instrumentationCache = instrumentationCache
+
+    # Set whether covered labels skip their cost function
+    def setGuardCovered(self,guardCovered):
+        self.guardCovered = guardCovered
+
 def main(argv):
     instrumenter = Instrumentation()
     program = ""
     outFile = ""
     labelFile = ""
     scoreEpsilon = 1
+    guardCovered = 0
 
     try:
-        opts, args = getopt.getopt(argv,"hp:l:o:k:")
+        opts, args = getopt.getopt(argv,"hp:l:o:k:c:g:i:")
     except getopt.GetoptError:
-        print 'Instrumentation.py -p <program name> -l <label file> -o <output filename> -k <constant to use for cost functions>'
+        print 'Instrumentation.py -p <program name> -l <label file> -o <output filename> -k <constant to use for cost functions> -c <compile cache size> -g <1 to skip covered labels> -i <1 to cache instrumentation>'
       	sys.exit(2)
   		
     for opt, arg in opts:
         if opt == "-h":
-            print 'Instrumentation.py -p <program name> -l <label file> -o <output filename> -k <constant to use for cost functions>'
+            print 'Instrumentation.py -p <program name> -l <label file> -o <output filename> -k <constant to use for cost functions> -c <compile cache size> -g <1 to skip covered labels> -i <1 to cache instrumentation>'
             sys.exit()
       	elif opt == "-p":
             if arg == "":
@@ -152,6 +227,13 @@ def main(argv):
             labelFile= arg
         elif opt == "-k":
             scoreEpsilon = float(opt)
+        elif opt == "-c":
+            instrumenter.verifier.compileCache = CompileCache(maxSize = int(arg))
+        elif opt == "-g":
+            guardCovered = int(arg)
+        elif opt == "-i":
+            if int(arg) == 1:
+                instrumenter.setInstrumentationCache(InstrumentationCache())
 
     if labelFile == "":
         labelFile = program[:program.index(".c")]+".labels"
@@ -163,6 +245,7 @@ def main(argv):
         raise Exception('No program specified')
     else:
         instrumenter.setScoreEpsilon(scoreEpsilon)
+        instrumenter.setGuardCovered(guardCovered)
 	instrumenter.instrument(program,labelFile,outFile)
 
 # Call into main
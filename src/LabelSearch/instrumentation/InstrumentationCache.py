@@ -0,0 +1,146 @@
+# Gregory Gay (greg@greggay.com)
+# On-disk cache of instrumentation results, so that programs are re-instrumented incrementally.
+# Holds three kinds of entries:
+# - Instrumented programs, by a hash of the program, its labels, the files it includes, and the instrumentation settings.
+#   Unchanged programs are re-instrumented by copying the cached output.
+# - Cost functions, by predicate. Only predicates that were never seen before are translated.
+# - Whether each label compiles, by the label and its place in the rest of the program.
+#   A label compiles or not depending on the code around it, so results are kept per version of that code
+#   (every line of the instrumented program that is not a label). Only labels that changed are checked by the compiler.
+# Entries are files, written to a temporary file and then renamed, so several processes can share a cache directory.
+# The format version is part of each key, so entries written by an older version are never read.
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import re
+import hashlib
+import tempfile
+import cPickle
+
+class InstrumentationCache():
+
+    # Version of the cached data. Increase it whenever the instrumentation output changes.
+    version = 2
+    # Directory holding the cached entries
+    directory = ""
+    # Number of programs answered from the cache
+    hits = 0
+    # Number of programs that were instrumented
+    misses = 0
+    # Number of predicates translated, as no cost function was cached
+    translated = 0
+    # Number of labels whose verification result was cached
+    labelHits = 0
+    # Number of labels checked by the compiler
+    labelMisses = 0
+    # Quoted includes, whose contents are part of the key
+    includePattern = re.compile(r"^\s*#include\s+\"([^\"]+)\"", re.MULTILINE)
+
+    def __init__(self, directory = ""):
+        if directory == "":
+            directory = os.path.join("/dev/shm" if os.access("/dev/shm", os.W_OK) else tempfile.gettempdir(), "labelsearch_instrumentation_cache")
+        self.directory = directory
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # Another process created it first
+                pass
+
+    # Start a key, with the version and the contents of the files that a program includes
+    def startKey(self, program, text):
+        key = hashlib.sha1("version " + str(self.version) + "\n")
+        for include in self.includePattern.findall(text):
+            fileName = os.path.join(os.path.dirname(program), include)
+            if os.path.isfile(fileName):
+                included = open(fileName, "rb")
+                key.update(hashlib.sha1(included.read()).hexdigest() + "\n")
+                included.close()
+            else:
+                key.update("missing " + include + "\n")
+
+        return key
+
+    # Build the cache key for instrumenting a program with the given labels and settings
+    def getProgramKey(self, program, labelFile, scoreEpsilon, guardCovered):
+        source = open(program, "rb")
+        text = source.read()
+        source.close()
+        labels = open(labelFile, "rb")
+        labelText = labels.read()
+        labels.close()
+
+        key = self.startKey(program, text)
+        key.update("epsilon " + repr(scoreEpsilon) + "\nguard " + str(guardCovered) + "\n")
+        key.update(hashlib.sha1(text).hexdigest() + "\n" + hashlib.sha1(labelText).hexdigest())
+        return "program_" + key.hexdigest()
+
+    # Build the key for the results of labels placed in the given lines of a program
+    def getContextKey(self, program, lines):
+        text = "".join(lines)
+        key = self.startKey(program, text)
+        key.update(text)
+        return "labels_" + key.hexdigest()
+
+    # Get the instrumented program. Returns its text, or None if not cached.
+    def lookupProgram(self, key):
+        text = self.read(key)
+        if text == None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return text
+
+    def storeProgram(self, key, text):
+        self.write(key, text)
+
+    # Get the cost functions of all predicates seen before, as a dictionary
+    def lookupCostFunctions(self):
+        costFunctions = self.read("cost_functions")
+        if costFunctions == None:
+            return {}
+        return costFunctions
+
+    # Store cost functions. Entries stored by other processes since they were read are kept.
+    def storeCostFunctions(self, costFunctions):
+        merged = self.lookupCostFunctions()
+        merged.update(costFunctions)
+        self.write("cost_functions", merged)
+
+    # Get the results of the labels checked in a context, as a dictionary from label site to whether it compiles
+    def lookupLabels(self, key):
+        results = self.read(key)
+        if results == None:
+            return {}
+        return results
+
+    # Store label results. Results stored by other processes since they were read are kept.
+    def storeLabels(self, key, results):
+        merged = self.lookupLabels(key)
+        merged.update(results)
+        self.write(key, merged)
+
+    # Read an entry. Returns None if there is no entry, or it was written by another version.
+    def read(self, name):
+        try:
+            entry = open(os.path.join(self.directory, name + "_v" + str(self.version)), "rb")
+            data = cPickle.load(entry)
+            entry.close()
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            return None
+        return data
+
+    # Write an entry to a temporary file, then rename it, so other processes never read a partial entry
+    def write(self, name, data):
+        (handle, staging) = tempfile.mkstemp(prefix = ".", dir = self.directory)
+        entry = os.fdopen(handle, "wb")
+        cPickle.dump(data, entry, cPickle.HIGHEST_PROTOCOL)
+        entry.close()
+        os.rename(staging, os.path.join(self.directory, name + "_v" + str(self.version)))
+
+    # Summary of cache use, for reporting
+    def getStatistics(self):
+        return "Instrumentation cache: " + str(self.hits) + " programs reused, " + str(self.translated) + " predicates translated, " + str(self.labelHits) + " labels reused, " + str(self.labelMisses) + " labels checked"
@@ -9,6 +9,8 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import re
+
 ###############################################################################
 #                                                                             #
 #  LEXER                                                                      #
@@ -45,193 +47,91 @@ class Token(object):
         return self.__str__()
 
 class Lexer(object):
+    # Tokens of a predicate, after any whitespace. Atoms start with a letter, digit, underscore, quote, minus, or star,
+    # and run until a comparison, NOT, or logical operator. They may contain spaces, calls, arithmetic, ->, and single & or |.
+    tokenPattern = re.compile(r"""\s*(?:
+        (?P<atom>[A-Za-z0-9_'"*-](?:->|[^<>=!&|]|&(?!&)|\|(?!\|))*)
+        |(?P<operator><=|>=|==|!=|&&|\|\||<|>|!|\(|\))
+        |(?P<other>\S))""", re.VERBOSE)
+    # Token types of operators
+    operatorTypes = {'<=': LTE, '>=': GTE, '==': EQ, '!=': NEQ, '&&': AND, '||': OR, '<': LT, '>': GT, '!': NOT, '(': LPAREN, ')': RPAREN}
+    # Errors for characters that cannot start a token
+    illegalUses = {'=': "Illegal use of assignment in predicate", '&': "Illegal use of bitwise AND", '|': "Illegal use of bitwise OR"}
+    # Anything but a space or parenthesis, following the closing parenthesis of a cast
+    castPattern = re.compile(r"[^ ()]")
+
     def __init__(self, text):
-        print text
-        # client string input, e.g. "4 + 2 * 3 - 6 / 2"
+        # client string input, e.g. "x > 3 && !(y == 2)"
         self.text = text
-        # self.pos is an index into self.text
-        self.pos = 0
-        self.current_char = self.text[self.pos]
+        # The whole predicate is tokenized up front. self.index is the next token to return.
+        self.tokens = self.tokenize(text)
+        self.index = 0
 
     def error(self, char):
         raise Exception("Invalid character: " + char)
 
-    def advance(self):
-        # Advance the `pos` pointer and set the `current_char` variable.
-        self.pos += 1
-        if self.pos > len(self.text) - 1:
-            self.current_char = None  # Indicates end of input
-        else:
-            self.current_char = self.text[self.pos]
-
-        #print self.current_char
-
-    def skip_whitespace(self):
-        while self.current_char is not None and self.current_char.isspace():
-            self.advance()
-
-    def atom(self):
-        # Return a multicharacter atom consumed from the input.
-        result = ''
-        done = 0
-        back = 0
-        possibleCast = 0
-        addToEnd = 0
-        # Hack to handle tokens with a cast (i.e., (void *) x) where the first parentheses is missed.  
-        lParen = 0
-        rParen = 0
-        while done == 0:
-            if self.current_char is None:
-                done = 1
-            elif (self.current_char == "<" or (self.current_char == ">" or (self.current_char == "=" or self.current_char == "!"))): 
-                done = 1
-                self.pos -= 1
-                back = 1
+    def tokenize(self, text):
+        tokens = []
+        pos = 0
+        while True:
+            match = self.tokenPattern.match(text, pos)
+            if match == None:
+                # Only whitespace remains
+                return tokens
+            pos = match.end()
+            kind = match.lastgroup
+            value = match.group(kind)
+
+            if kind == "atom":
+                (value, closing) = self.atom(value)
+                tokens.append(Token(ATOM, value))
+                for paren in range(0, closing):
+                    tokens.append(Token(RPAREN, ')'))
+            elif kind == "operator":
+                tokens.append(Token(self.operatorTypes[value], value))
+            elif value in self.illegalUses:
+                raise Exception(self.illegalUses[value])
             else:
-                if self.current_char == "&" or self.current_char == "|":
-                    next_char = self.text[self.pos+1:self.pos+2]
-                    
-                    if (self.current_char == "&" and next_char == "&") or (self.current_char == "|" and next_char == "|"):
-                        done = 1
-                        self.pos -=1
-                        back = 1
-                    else:
-                        result += self.current_char
-                        self.advance()
-                else:
-                    if self.current_char == "(":
-                        lParen += 1
-                    elif self.current_char == ")":
-                        rParen += 1
-                        if rParen == 1 and lParen == 0:
-                            possibleCast = 1
-                    elif self.current_char != " " and possibleCast == 1:
-                        possibleCast = 2
-                         
-
-                    result += self.current_char
-                    self.advance()
-
-        while result[len(result)-1] == " ":
-            result = result[:len(result)-1]
-            self.pos -=1
-            back = 1
-       
-        if possibleCast == 2:
+                self.error(value)
+
+    def atom(self, text):
+        # Tidy up a multicharacter atom. Returns the atom, and the number of closing parentheses that follow it.
+        result = text.rstrip(" ")
+        closing = 0
+        lParen = result.count("(")
+        rParen = result.count(")")
+
+        # Tokens with a cast (i.e., (void *) x) lose their first parenthesis to LPAREN.
+        # The cast is kept in the atom, which is closed with a parenthesis to match that LPAREN.
+        firstRParen = result.find(")")
+        if firstRParen >= 0 and "(" not in result[:firstRParen] and self.castPattern.search(result, firstRParen + 1):
             result = "(" + result
-            self.text = self.text[:self.pos+1] + ")" + self.text[self.pos+1:]
-            if back == 0:
-                self.pos -=1
-                back = 1
+            closing += 1
             lParen += 1
- 
-        if rParen > lParen: 
-            diff = rParen - lParen
-                      
-            for add in range(0,diff):
-                if result[len(result)-1:] == ")":
-                    result = result[:len(result)-1]
-                    self.pos -=1
-                    back = 1
-                    
-        if back == 1:
-            self.advance()
-
-        #print "--" + result
-        #print "---" + self.text #[self.pos:]
-        #print "----" + str(self.current_char)
-        return result
+
+        # Parentheses that close an enclosing expression are not part of the atom
+        for paren in range(0, rParen - lParen):
+            if result[len(result)-1:] == ")":
+                result = result[:len(result)-1]
+                closing += 1
+
+        return (result, closing)
 
     # Look ahead at next token
     def look_ahead(self):
-        if self.pos < len(self.text):
-            current_pos = self.pos
-            current_text = self.text
-            token = self.get_next_token()
-            self.pos = current_pos
-            self.text = current_text
-            self.current_char = self.text[self.pos]
-
-            return token
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
         else:
             return Token(EOF, None)
 
     def get_next_token(self):
         """Lexical analyzer (also known as scanner or tokenizer)
 
-        This method is responsible for breaking a sentence
-        apart into tokens. One token at a time.
+        Returns the tokens of the sentence, one token at a time.
         """
-        while self.current_char is not None:
-            #print "-----"+str(self.current_char) + "," + str(self.pos) + "," + self.text[self.pos:]
-
-            if self.current_char.isspace():
-                self.skip_whitespace()
-                continue
-
-            if self.current_char.isalnum() or self.current_char == '_' or \
-                self.current_char == "\'" or self.current_char == "\"" or self.current_char == "-" or self.current_char == "*":
-                return Token(ATOM, self.atom())
-
-            if self.current_char == '<':
-                self.advance()
-                if self.current_char == '=':
-                    self.advance()
-                    return Token(LTE, '<=')
-                else:
-                    return Token(LT, '<')
-
-            if self.current_char == '>':
-                self.advance()
-                if self.current_char == '=':
-                    self.advance()
-                    return Token(GTE, '>=')
-                else:
-                    return Token(GT, '>')
-
-            if self.current_char == '=':
-                self.advance()
-                if self.current_char == '=':
-                    self.advance()
-                    return Token(EQ, '==')
-                else:
-                    raise Exception("Illegal use of assignment in predicate")
-
-            if self.current_char == '!':
-                self.advance()
-                if self.current_char == '=':
-                    self.advance()
-                    return Token(NEQ, '!=')
-                else:
-                    return Token(NOT, '!')
-
-            if self.current_char == '&':
-                self.advance()
-                if self.current_char == '&':
-                    self.advance()
-                    return Token(AND, '&&')
-                else:
-                    raise Exception("Illegal use of bitwise AND")
-
-            if self.current_char == '|':
-                self.advance()
-                if self.current_char == '|':
-                    self.advance()
-                    return Token(OR, '||')
-                else:
-                    raise Exception("Illegal use of bitwise OR")
-
-            if self.current_char == '(':
-                self.advance()
-                return Token(LPAREN, '(')
-
-            if self.current_char == ')':
-                self.advance()
-                return Token(RPAREN, ')')
-
-            self.error(self.current_char)
-
-        return Token(EOF, None)
+        token = self.look_ahead()
+        self.index += 1
+        return token
 
 ###############################################################################
 #                                                                             #
@@ -427,6 +327,8 @@ class Interpreter(NodeVisitor):
     def __init__(self, parser):
         self.parser = parser
 
+    # Distances are built from helper functions that the instrumentation defines in the program,
+    # so that each operand and sub-expression is evaluated once, and appears once in the source.
     def visit_BinOp(self, node):
         if node.op.type == LT:
             self.boolVar = 0
@@ -434,56 +336,56 @@ class Interpreter(NodeVisitor):
             self.boolVar = 0
             rhs = self.visit(node.right)
             self.boolVar = 1
-            return "(" + lhs + " - " + rhs + " < 0 ? 0 : (" + lhs + " - " + rhs + ") + scoreEpsilon)"
+            return "pc_lt(" + lhs + " - " + rhs + ")"
         elif node.op.type == LTE:
             self.boolVar = 0
             lhs = self.visit(node.left)
             self.boolVar = 0
             rhs = self.visit(node.right)
             self.boolVar = 1
-            return "(" + lhs + " - " + rhs + " <= 0 ? 0 : (" + lhs + " - " + rhs + ") + scoreEpsilon)"
+            return "pc_le(" + lhs + " - " + rhs + ")"
         elif node.op.type == GT:
             self.boolVar = 0
             lhs = self.visit(node.left)
             self.boolVar = 0
             rhs = self.visit(node.right)
             self.boolVar = 1
-            return "(" + rhs + " - " + lhs + " < 0 ? 0 : (" + rhs + " - " + lhs + ") + scoreEpsilon)"
+            return "pc_lt(" + rhs + " - " + lhs + ")"
         elif node.op.type == GTE:
             self.boolVar = 0
             lhs = self.visit(node.left)
             self.boolVar = 0
             rhs = self.visit(node.right)
             self.boolVar = 1
-            return "(" + rhs + " - " + lhs + " <= 0 ? 0 : (" + rhs + " - " + lhs + ") + scoreEpsilon)"
+            return "pc_le(" + rhs + " - " + lhs + ")"
         elif node.op.type == EQ:
             self.boolVar = 0
             lhs = self.visit(node.left)
             self.boolVar = 0
             rhs = self.visit(node.right)
             self.boolVar = 1
-            return "(abs(" + lhs + " - " + rhs + ") == 0 ? 0 : abs(" + lhs + " - " + rhs + ") + scoreEpsilon)"
+            return "pc_eq(abs(" + lhs + " - " + rhs + "))"
         elif node.op.type == NEQ:
             self.boolVar = 0
             lhs = self.visit(node.left)
             self.boolVar = 0
             rhs = self.visit(node.right)
             self.boolVar = 1
-            return "(abs(" + lhs + " - " + rhs + ") != 0 ? 0 : scoreEpsilon)"
+            return "pc_ne(abs(" + lhs + " - " + rhs + "))"
         elif node.op.type == AND:
             self.boolVar = 1
             lhs = self.visit(node.left)
             self.boolVar = 1
             rhs = self.visit(node.right)
             self.boolVar = 1
-            return "(" + lhs + " + " + rhs + ")" 
+            return "pc_and(" + lhs + ", " + rhs + ")"
         elif node.op.type == OR:
             self.boolVar = 1
             lhs = self.visit(node.left)
             self.boolVar = 1
             rhs = self.visit(node.right)
             self.boolVar = 1
-            return "(" +lhs + " < " + rhs + " ? " + lhs + " : " + rhs + ")" 
+            return "pc_or(" + lhs + ", " + rhs + ")"
         
     def visit_Atom(self, node):
         if self.boolVar == 1:
@@ -1,6 +1,13 @@
 # Gregory Gay (greg@greggay.com)
 # Verify obligations to ensure that they compile. 
 # If they do not, comment them out and replace with dummy score.
+# All labels are checked in one syntax-only compiler pass. In a copy of the program, each label is wrapped in its own
+# nested function (a GCC extension, which keeps access to the variables in scope), as the compiler only reports
+# the first use of an undeclared name in each function. A #line directive names the label, so the compiler
+# reports errors in a label against its identifier.
+# All labels with errors are replaced at once, and the program is checked again,
+# until no label has errors. The number of passes does not depend on the number of broken labels.
+# If an instrumentation cache is set, labels that were checked before, in the same surroundings, are not checked again.
 
 # Command line options:
 # -s <program filename>
@@ -13,15 +20,33 @@
 import getopt
 import sys
 import os
+import re
+import tempfile
 from subprocess import Popen, call, PIPE, STDOUT
+from ..generation.Workspace import Workspace
 
 class Verifier(): 
 
     # Text of instrumented program
     program = []
+    # Scratch directories for the compiled program
+    workspace = Workspace()
+    # Cache of compiler output. If set, programs that were compiled before are not compiled again.
+    compileCache = None
+    # Name that errors in labels are reported under. The line number is the label identifier.
+    labelFile = "pc_label"
+    # Lines that assign a score to an obligation, as written by the instrumentation
+    labelPattern = re.compile(r"^obligations\[\s*(\d+)\s*\]\s*=")
+    # Errors reported against a label
+    labelErrorPattern = re.compile(r"^" + labelFile + r":(\d+):(?:\d+:)? (?:fatal )?error:", re.MULTILINE)
+    # Cache of instrumentation results. If set, the results of labels checked before are reused.
+    instrumentationCache = None
+    # Lines added by the instrumentation that change with the labels or settings, but not with the code around labels
+    instrumentationPattern = re.compile(r"^(float obligations\[|float scoreEpsilon =)")
 
     # Imports the instrumented program
     def importProgram(self,fileName):
+        self.program = []
         code = open(fileName, "r")
 
         for line in code:
@@ -38,61 +63,129 @@ class Verifier():
  
         where.close()
 
-    # Identify the obligations to fix
+    # Find the label on each line. Returns a dictionary of label identifiers, by line index.
+    def getLabelLines(self):
+        labels = {}
+        for entry in range(0,len(self.program)):
+            match = self.labelPattern.match(self.program[entry])
+            if match != None:
+                labels[entry] = match.group(1)
+
+        return labels
+
+    # Build the copy of the program that is checked. Lines after each label are renumbered back to their
+    # place in the program, so other errors are reported against the original file and line.
+    def buildCheckedProgram(self, labels, fileName):
+        checked = ["#line 1 \"" + fileName + "\"\n"]
+        # Line of the written program that the current entry starts on. Fixed labels span several lines.
+        line = 1
+        for entry in range(0,len(self.program)):
+            line += self.program[entry].count("\n")
+            if entry in labels:
+                checked.append("{ void pc_check_" + labels[entry] + "(void){\n")
+                checked.append("#line " + labels[entry] + " \"" + self.labelFile + "\"\n")
+                checked.append(self.program[entry].rstrip("\n") + " } }\n")
+                checked.append("#line " + str(line) + " \"" + fileName + "\"\n")
+            else:
+                checked.append(self.program[entry])
+
+        return checked
+
+    # Identify the obligations to fix. Returns the identifiers of labels with errors, and the other errors.
     def getObligationList(self, errorMessage):
         obligations = []
-        # Get each line with the word error in it.
-        lines = errorMessage.split("error:")
-        for line in lines:
-            words = line.split(" ")
-            for word in words:
-                # Look for the obligation expression
-                if "obligation" in word and "=" in word:
-                    parts = word.split("=")
-                    if parts[0] not in obligations:
-                        obligations.append(parts[0])
-
-        return obligations
+        for identifier in self.labelErrorPattern.findall(errorMessage):
+            if identifier not in obligations:
+                obligations.append(identifier)
+
+        others = []
+        for line in errorMessage.split("\n"):
+            if "error:" in line and not line.startswith(self.labelFile + ":"):
+                others.append(line)
+
+        return (obligations, others)
 
     # Fix obligations in program
-    def fixObligations(self, obligations):
-        for entry in range(0,len(self.program)):
-            if "obligations[" in self.program[entry]:
+    def fixObligations(self, obligations, labels):
+        for entry in labels:
+            if labels[entry] in obligations:
                 words = self.program[entry].split("=")
-                if words[0] in obligations:
-                    self.program[entry] = "// Removed as non-compiling\n" + "// " + self.program[entry] + words[0] + " = 1000000;\n"
+                self.program[entry] = "// Removed as non-compiling\n" + "// " + self.program[entry].rstrip("\n") + "\n" + words[0] + " = 1000000;\n"
+
+    # Find where each label sits in the rest of the program.
+    # Returns the key of the rest of the program, and the site of each label (its line, and the number of lines before it), by line index.
+    def getLabelSites(self, labels, fileName):
+        lines = []
+        sites = {}
+        for entry in range(0,len(self.program)):
+            if entry in labels:
+                sites[entry] = (len(lines), self.program[entry])
+            elif self.instrumentationPattern.match(self.program[entry]) == None:
+                lines.append(self.program[entry])
 
-    # Performs verification on a suite already in-memory
+        return (self.instrumentationCache.getContextKey(fileName, lines), sites)
+
+    # Performs verification on a suite already in-memory. Returns whether the program compiles, apart from removed labels.
     def verify(self, fileName, outFile):
         self.importProgram(fileName)
+        labels = self.getLabelLines()
+
+        # Labels with cached results are fixed or left as they are. If every result is cached, the compiler is not run.
+        if self.instrumentationCache != None:
+            (context, sites) = self.getLabelSites(labels, outFile)
+            results = self.instrumentationCache.lookupLabels(context)
+            cached = [entry for entry in labels if sites[entry] in results]
+            self.instrumentationCache.labelHits += len(cached)
+            self.instrumentationCache.labelMisses += len(labels) - len(cached)
+            self.fixObligations([labels[entry] for entry in cached if not results[sites[entry]]], labels)
+            if len(cached) == len(labels):
+                self.writeProgram(outFile)
+                return True
+            for entry in cached:
+                del labels[entry]
+
+        # Check all labels in one pass, and fix every label with errors. Checked again, as the fixes may expose new errors.
+        (output, error) = self.checkProgram(labels, outFile)
+        (obligations, others) = self.getObligationList(error)
+
+        while obligations != []:
+            print "Compilation error - fixing " + str(len(obligations)) + " obligations"
+            print obligations
+            self.fixObligations(obligations, labels)
+            labels = dict([(entry, labels[entry]) for entry in labels if labels[entry] not in obligations])
+            (output, error) = self.checkProgram(labels, outFile)
+            (obligations, others) = self.getObligationList(error)
+
+        if others != []:
+            print "Compilation error due to non-obligation issue:\n" + "\n".join(others)
+        elif self.instrumentationCache != None:
+            # Results are only kept for programs that compile, as errors elsewhere may hide errors in labels.
+            # Labels that do not compile have been replaced.
+            self.instrumentationCache.storeLabels(context, dict([(sites[entry], self.program[entry] == sites[entry][1]) for entry in sites]))
+
+        self.writeProgram(outFile)
+        return others == []
+
+    # Checks the syntax and types of the program and all of its labels, without building it
+    def checkProgram(self, labels, fileName):
+        # The copy is placed beside the program, so its includes are found as they would be for the program
+        (handle, checkFile) = tempfile.mkstemp(prefix = ".", suffix = ".c", dir = os.path.dirname(os.path.abspath(fileName)))
+        where = os.fdopen(handle, "w")
+        where.writelines(self.buildCheckedProgram(labels, os.path.basename(fileName)))
+        where.close()
 
-        # Compile and attempt to run the suite.
-        (output, error) = self.compileProgram(outFile)
-
-        while error != "" and "error:" in error:
-            if "obligations" in error:
-                print "Compilation error - attempting to fix obligations"
-                obligations = self.getObligationList(error)
-                print obligations
-                self.fixObligations(obligations)
-                (output, error) = self.compileProgram(outFile)
+        try:
+            if self.compileCache != None:
+                # Nothing is built, but the cache expects an output file
+                directory = self.workspace.create()
+                (cOutput, cError) = self.compileCache.compile(checkFile, os.path.join(directory, "program"), "-fsyntax-only")
+                self.workspace.remove(directory)
             else:
-                print "Compilation error due to non-obligation issue:\n" + error
-                error = ""
-
-    # Compiles and runs suite
-    def compileProgram(self, fileName):
-        self.writeProgram(fileName)
-
-        if os.path.isfile(fileName):
-            path = os.path.dirname(fileName)
-            compileProcess = Popen("gcc " + fileName + " -lm", stdout = PIPE, stderr = PIPE, shell=True)
-            (cOutput, cError) = compileProcess.communicate()
-            rmProcess = Popen("rm a.out", stdout = PIPE, stderr = PIPE, shell = True)
-            (rOutput, eError) = rmProcess.communicate()
-            return (cOutput, cError)        
-        else:
-            raise Exception("The program file does not exist.")
+                compileProcess = Popen("gcc " + checkFile + " -fsyntax-only", stdout = PIPE, stderr = PIPE, shell=True)
+                (cOutput, cError) = compileProcess.communicate()
+        finally:
+            os.remove(checkFile)
+        return (cOutput, cError)
 
 def main(argv):
     verifier = Verifier()
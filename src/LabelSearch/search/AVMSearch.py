@@ -0,0 +1,341 @@
+# Gregory Gay (greg@greggay.com)
+# Local search using the Alternating Variable Method (AVM).
+# Starts from a random suite, and optimizes the literal inputs of its tests one at a time.
+# Each literal is nudged in both directions (exploratory moves). When a direction improves
+# the suite score, steps in that direction are repeatedly doubled (pattern moves).
+# Fitness is the suite score, calculated from the distances computed by the instrumentation.
+# A move only re-executes the modified test - the scores of the other tests are reused.
+# When a full pass over all literals brings no improvement, the search restarts from a new random suite.
+
+# Command line options:
+# -p <instrumented program>
+# -o <basename of test suite, default is (instrumented program)_suite.c>
+# -l <maximum single test length, default is 10 steps (assignments or calls)>
+# -m <maximum test suite size, default is 25>
+# -b <search budget, default is 120 seconds>
+# -r <number of decimal places explored for floating-point literals, default is 3>
+# -s <random seed, optional>
+# -c (compile the program once into an object file, and link suites against it)
+# -d (evaluate suites through a data-driven harness compiled once per program)
+# -f (run the data-driven harness as a fork-server, implies -d)
+# -t <number of executed tests to cache, default is 0 (no caching)>
+# -w <time limit on a single test, in seconds, default is 0 (no limit)>
+# -W <time limit on a whole suite, in seconds, default is 0 (no limit)>
+# -a (keep compile and run artifacts in their workspace directories, for debugging)
+# -C <number of compilations to cache on disk, default is 0 (no caching)>
+# -D (cache the parsed program data on disk, so later runs on the same program skip parsing)
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import copy
+import getopt
+import sys
+import os
+import math
+import time
+import random
+from ..generation.Generator import Generator
+from ..generation.LiteralEditor import LiteralEditor
+from ..structures.TestSuite import TestSuite
+from ..structures.TestCache import TestCache
+from ..generation.CompileCache import CompileCache
+from ..generation.ProgramDataCache import ProgramDataCache
+
+class AVMSearch():
+
+    # Suite generator
+    generator = Generator()
+    # Program filename
+    program = ""
+    # Suite basename
+    outFile = ""
+    # Search budget
+    budget = 120
+    # Max suite size
+    maxSuiteSize = 25.0
+    # Max test length
+    maxLength = 10.0
+    # Smallest step taken on floating-point literals is 10^-precision
+    precision = 3
+    # Random seed (None uses the system default)
+    seed = None
+    # If 1, the program is compiled once and suites are linked against the object file
+    prebuild = 0
+    # If 1, suites are evaluated through the data-driven harness where possible
+    dataDriven = 0
+    # If 1, the data-driven harness runs as a long-lived fork-server
+    forkServer = 0
+    # Maximum number of executed tests to cache. If 0, tests are not cached.
+    cacheSize = 0
+    # Seconds a single test may run. If 0, tests are not limited.
+    testLimit = 0
+    # Seconds a whole suite may run. If 0, suites are not limited.
+    suiteLimit = 0
+    # If 1, compile and run artifacts are kept for debugging
+    keepArtifacts = 0
+    # Maximum number of compilations to cache. If 0, compiler output is not cached.
+    compileCacheSize = 0
+    # If 1, parsed program data is cached on disk
+    cacheProgramData = 0
+    # Reads and replaces the literals in test code
+    literals = LiteralEditor()
+    # Number of moves evaluated so far
+    evaluations = 0
+    # Time the search started
+    startTime = 0
+
+    # Central search
+    def search(self):
+        random.seed(self.seed)
+
+        # Set up generator
+        self.generator.setProgram(self.program)
+        self.generator.maxLength = self.maxLength
+        self.generator.maxSuiteSize = self.maxSuiteSize
+        if self.compileCacheSize > 0:
+            self.generator.compileCache = CompileCache(maxSize = self.compileCacheSize)
+        if self.cacheProgramData == 1:
+            self.generator.programDataCache = ProgramDataCache()
+        if self.prebuild == 1:
+            self.generator.buildProgramObject()
+        if self.dataDriven == 1 or self.forkServer == 1:
+            self.generator.buildHarness()
+            self.generator.harness.forkServer = self.forkServer
+        if self.cacheSize > 0:
+            self.generator.testCache = TestCache(self.cacheSize)
+            self.generator.testCache.setProgram(self.program)
+        self.generator.timeouts.testLimit = self.testLimit
+        self.generator.timeouts.suiteLimit = self.suiteLimit
+        self.generator.workspace.keep = self.keepArtifacts
+
+        bestScore = 1000000
+        bestSuite = TestSuite()
+
+        restart = 0
+        self.evaluations = 0
+        self.startTime = time.time()
+        while not self.outOfBudget():
+            restart += 1
+            suite = self.generator.generate(self.getSuiteName(""))
+            suite = self.optimize(suite)
+
+            if suite.getScore() < bestScore:
+                bestSuite = copy.deepcopy(suite)
+                bestScore = bestSuite.getScore()
+
+            # What is the best suite seen?
+            print "Restart " + str(restart) + ":"
+            print "Best Score: " + str(bestScore)
+            print bestSuite.getObligations()
+            print "Evaluations: " + str(self.evaluations)
+            if self.generator.testCache != None:
+                print self.generator.testCache.getStatistics()
+            if self.generator.compileCache != None:
+                print self.generator.compileCache.getStatistics()
+            if self.testLimit > 0 or self.suiteLimit > 0:
+                print self.generator.timeouts.getStatistics()
+
+            bestSuite.setFileName(self.getSuiteName("_best"))
+            bestSuite.writeSuiteFile()
+            if os.path.exists(suite.getFileName()):
+                os.remove(suite.getFileName())
+
+            print "Elapsed Time: " + str(time.time() - self.startTime)
+
+        if self.generator.harness != None:
+            self.generator.harness.close()
+
+    # Apply AVM to every literal of the suite until a full pass brings no improvement, or the budget runs out.
+    def optimize(self, suite):
+        improved = 1
+        while improved == 1 and not self.outOfBudget():
+            improved = 0
+            for testIndex in range(0, len(suite.getTests())):
+                if suite.getTestList()[testIndex] == 0 or suite.getTestObligations()[testIndex] == None:
+                    continue
+
+                for literalIndex in range(0, len(self.literals.getLiterals(suite.getTests()[testIndex]))):
+                    if self.outOfBudget():
+                        return suite
+                    if self.optimizeLiteral(suite, testIndex, literalIndex) == 1:
+                        improved = 1
+
+                if suite.getScore() == 0:
+                    return suite
+
+        return suite
+
+    # Optimize a single literal. Returns 1 if the suite score improved.
+    def optimizeLiteral(self, suite, testIndex, literalIndex):
+        improved = 0
+        (value, kind) = self.literals.getLiterals(suite.getTests()[testIndex])[literalIndex]
+        step = 1
+        if kind == "float":
+            step = 1.0
+
+        while not self.outOfBudget():
+            # Exploratory moves - try a small step in each direction
+            direction = 0
+            for candidate in [1, -1]:
+                if self.tryMove(suite, testIndex, literalIndex, value + candidate * step, kind):
+                    direction = candidate
+                    break
+
+            if direction == 0:
+                # Floating-point literals are refined at smaller steps before moving on
+                if kind == "float" and step > math.pow(10, -self.precision):
+                    step = step / 10.0
+                    continue
+                break
+
+            improved = 1
+            # Pattern moves - keep accelerating in the improving direction
+            value = value + direction * step
+            patternStep = step * 2
+            while not self.outOfBudget() and self.tryMove(suite, testIndex, literalIndex, value + direction * patternStep, kind):
+                value = value + direction * patternStep
+                patternStep = patternStep * 2
+
+        return improved
+
+    # Evaluate the suite with one literal changed. The change is kept if it improves the suite score.
+    def tryMove(self, suite, testIndex, literalIndex, value, kind):
+        if kind == "char" and (value < 0 or value > 255):
+            return False
+        if kind == "float" and (math.isinf(value) or math.isnan(value)):
+            return False
+
+        test = self.literals.setLiteral(suite.getTests()[testIndex], literalIndex, value, kind)
+        self.evaluations += 1
+
+        # Only the modified test is executed
+        single = self.generator.evaluate([test], self.getSuiteName("_move"))
+        if os.path.exists(single.getFileName()):
+            os.remove(single.getFileName())
+        if len(single.getTests()) == 0 or single.getTestObligations()[0] == None:
+            # The modified test fails, and is not kept
+            return False
+
+        testObligations = list(suite.getTestObligations())
+        previous = testObligations[testIndex]
+        testObligations[testIndex] = single.getTestObligations()[0]
+        previousScore = suite.getScore()
+        suite.setTestObligations(testObligations)
+        suite.mergeTestObligations(len(testObligations[testIndex]))
+
+        if suite.getScore() < previousScore:
+            tests = suite.getTests()
+            tests[testIndex] = test
+            suite.setTests(tests)
+            return True
+
+        # Undo the move
+        testObligations[testIndex] = previous
+        suite.setTestObligations(testObligations)
+        suite.mergeTestObligations(len(previous))
+        return False
+
+    # Has the search budget been used up?
+    def outOfBudget(self):
+        return time.time() - self.startTime >= self.budget
+
+    # Build the filename of a suite from the suite basename
+    def getSuiteName(self, suffix):
+        if ".c" in self.outFile:
+            return self.outFile[:self.outFile.index(".c")] + suffix + ".c"
+        else:
+            return self.outFile + suffix + ".c"
+
+def main(argv):
+    search = AVMSearch()
+    program = ""
+    outFile = ""
+    maxSuiteSize = 25.0
+    maxLength = 10.0
+    budget = 120
+    precision = 3
+    seed = None
+    prebuild = 0
+    dataDriven = 0
+    forkServer = 0
+    cacheSize = 0
+    testLimit = 0
+    suiteLimit = 0
+    keepArtifacts = 0
+    compileCacheSize = 0
+    cacheProgramData = 0
+
+    try:
+        opts, args = getopt.getopt(argv,"hp:o:l:m:b:r:s:cdft:w:W:aC:D")
+    except getopt.GetoptError:
+        print 'AVMSearch.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size> -b <search budget> -r <float precision> -s <random seed> -c -d -f -t <test cache size> -w <test time limit> -W <suite time limit> -a -C <compile cache size> -D'
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt == "-h":
+            print 'AVMSearch.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size> -b <search budget> -r <float precision> -s <random seed> -c -d -f -t <test cache size> -w <test time limit> -W <suite time limit> -a -C <compile cache size> -D'
+            sys.exit()
+        elif opt == "-p":
+            if arg == "":
+                raise Exception('No program specified')
+            else:
+                program = arg
+        elif opt == "-o":
+            outFile = arg
+        elif opt == "-l":
+            maxLength = float(arg)
+        elif opt == "-m":
+            maxSuiteSize = float(arg)
+        elif opt == "-b":
+            budget = int(arg)
+        elif opt == "-r":
+            precision = int(arg)
+        elif opt == "-s":
+            seed = int(arg)
+        elif opt == "-c":
+            prebuild = 1
+        elif opt == "-d":
+            dataDriven = 1
+        elif opt == "-f":
+            forkServer = 1
+        elif opt == "-t":
+            cacheSize = int(arg)
+        elif opt == "-w":
+            testLimit = float(arg)
+        elif opt == "-W":
+            suiteLimit = float(arg)
+        elif opt == "-a":
+            keepArtifacts = 1
+        elif opt == "-C":
+            compileCacheSize = int(arg)
+        elif opt == "-D":
+            cacheProgramData = 1
+
+    if program == "":
+        raise Exception('No program specified')
+    else:
+        if outFile == "":
+            outFile = program[:program.index(".c")]+"_suite"
+        search.budget = budget
+        search.precision = precision
+        search.seed = seed
+        search.prebuild = prebuild
+        search.dataDriven = dataDriven
+        search.forkServer = forkServer
+        search.cacheSize = cacheSize
+        search.testLimit = testLimit
+        search.suiteLimit = suiteLimit
+        search.keepArtifacts = keepArtifacts
+        search.compileCacheSize = compileCacheSize
+        search.cacheProgramData = cacheProgramData
+        search.maxLength = maxLength
+        search.maxSuiteSize = maxSuiteSize
+        search.program = program
+        search.outFile = outFile
+        search.search()
+
+# Call into main
+if __name__ == '__main__':
+    main(sys.argv[1:])
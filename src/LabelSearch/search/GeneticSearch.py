@@ -0,0 +1,480 @@
+# Gregory Gay (greg@greggay.com)
+# Whole-suite genetic algorithm. Evolves a population of test suites across generations,
+# returning the best seen when the budget runs out.
+# Parents are chosen through tournament selection, and exchange tests through single-point crossover.
+# Offspring are mutated by inserting a test, deleting a test, changing a literal, or appending a
+# step to a state-impacting test. The best suites of each generation are carried over unchanged.
+# Only new and modified tests are executed - the scores of unchanged tests are reused.
+
+# Command line options:
+# -p <instrumented program>
+# -o <basename of test suite, default is (instrumented program)_suite.c>
+# -l <maximum single test length, default is 10 steps (assignments or calls)>
+# -m <maximum test suite size, default is 25>
+# -b <search budget, default is 120 seconds>
+# -n <population size, default is 50>
+# -e <number of elite suites carried over each generation, default is 1>
+# -k <tournament size, default is 2>
+# -x <crossover probability, default is 0.75>
+# -u <mutation probability, default is 0.8>
+# -s <random seed, optional>
+# -c (compile the program once into an object file, and link suites against it)
+# -d (evaluate suites through a data-driven harness compiled once per program)
+# -f (run the data-driven harness as a fork-server, implies -d)
+# -t <number of executed tests to cache, default is 0 (no caching)>
+# -w <time limit on a single test, in seconds, default is 0 (no limit)>
+# -W <time limit on a whole suite, in seconds, default is 0 (no limit)>
+# -a (keep compile and run artifacts in their workspace directories, for debugging)
+# -C <number of compilations to cache on disk, default is 0 (no caching)>
+# -D (cache the parsed program data on disk, so later runs on the same program skip parsing)
+# -B (compile the suites of each generation into a single executable)
+# -P <number of threads compiling suites in the evaluation pipeline, default is 0 (no pipeline)>
+# -E <number of threads executing suites in the evaluation pipeline, default is 2>
+# -T (run the tests of each generation through the harness as one prefix trie, executing shared first steps once, implies -d and -B)
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import copy
+import getopt
+import sys
+import os
+import time
+import random
+from ..generation.Generator import Generator
+from ..generation.LiteralEditor import LiteralEditor
+from ..structures.TestSuite import TestSuite
+from ..structures.TestCache import TestCache
+from ..generation.CompileCache import CompileCache
+from ..generation.ProgramDataCache import ProgramDataCache
+from ..generation.Pipeline import Pipeline
+
+class GeneticSearch():
+
+    # Suite generator
+    generator = Generator()
+    # Program filename
+    program = ""
+    # Suite basename
+    outFile = ""
+    # Search budget
+    budget = 120
+    # Population
+    population = 50
+    # Number of elite suites carried over to the next generation
+    elites = 1
+    # Number of suites competing in each tournament
+    tournamentSize = 2
+    # Probability of crossover between two parents
+    crossoverRate = 0.75
+    # Probability of mutating an offspring
+    mutationRate = 0.8
+    # Max suite size
+    maxSuiteSize = 25.0
+    # Max test length
+    maxLength = 10.0
+    # Random seed (None uses the system default)
+    seed = None
+    # If 1, the program is compiled once and suites are linked against the object file
+    prebuild = 0
+    # If 1, suites are evaluated through the data-driven harness where possible
+    dataDriven = 0
+    # If 1, the data-driven harness runs as a long-lived fork-server
+    forkServer = 0
+    # Maximum number of executed tests to cache. If 0, tests are not cached.
+    cacheSize = 0
+    # Seconds a single test may run. If 0, tests are not limited.
+    testLimit = 0
+    # Seconds a whole suite may run. If 0, suites are not limited.
+    suiteLimit = 0
+    # If 1, compile and run artifacts are kept for debugging
+    keepArtifacts = 0
+    # Maximum number of compilations to cache. If 0, compiler output is not cached.
+    compileCacheSize = 0
+    # If 1, parsed program data is cached on disk
+    cacheProgramData = 0
+    # If 1, the suites of a generation are compiled into a single executable
+    batch = 0
+    # Threads per stage of the evaluation pipeline. If compileThreads is 0, suites are evaluated one at a time.
+    compileThreads = 0
+    executeThreads = 2
+    # If 1, the tests of a generation are run through the harness as a prefix trie, sharing the steps that start several tests
+    sharePrefixes = 0
+    # Reads and replaces the literals in test code
+    literals = LiteralEditor()
+    # Number of tests executed so far
+    testsExecuted = 0
+
+    # Central search
+    def search(self):
+        random.seed(self.seed)
+
+        # Set up generator
+        self.generator.setProgram(self.program)
+        self.generator.maxLength = self.maxLength
+        self.generator.maxSuiteSize = self.maxSuiteSize
+        if self.compileCacheSize > 0:
+            self.generator.compileCache = CompileCache(maxSize = self.compileCacheSize)
+        if self.cacheProgramData == 1:
+            self.generator.programDataCache = ProgramDataCache()
+        if self.prebuild == 1:
+            self.generator.buildProgramObject()
+        if self.dataDriven == 1 or self.forkServer == 1 or self.sharePrefixes == 1:
+            self.generator.buildHarness()
+            self.generator.harness.forkServer = self.forkServer
+            self.generator.harness.sharePrefixes = self.sharePrefixes
+        if self.cacheSize > 0:
+            self.generator.testCache = TestCache(self.cacheSize)
+            self.generator.testCache.setProgram(self.program)
+        self.generator.timeouts.testLimit = self.testLimit
+        self.generator.timeouts.suiteLimit = self.suiteLimit
+        self.generator.workspace.keep = self.keepArtifacts
+
+        startTime = time.time()
+        self.testsExecuted = 0
+
+        # Initial population of random suites
+        population = []
+        if self.batch == 1 or self.sharePrefixes == 1:
+            # Tests are built before any suite is evaluated. The harness may have parsed the program already.
+            if self.generator.getFunctions()==[] or self.generator.getStateVariables()==[] or self.generator.getDependencyMap()==[]:
+                self.generator.initializeProgramData()
+            testSets = []
+            for index in range(0, self.population):
+                testSets.append(self.generator.buildSuite())
+            population = self.generator.evaluateBatch(testSets, [self.getSuiteName(str(index)) for index in range(0, self.population)], self.getSuiteName("_batch"))
+        elif self.compileThreads > 0:
+            pipeline = Pipeline(self.generator, self.compileThreads, self.executeThreads)
+            population = pipeline.generate([self.getSuiteName(str(index)) for index in range(0, self.population)])
+        else:
+            for index in range(0, self.population):
+                population.append(self.generator.generate(self.getSuiteName(str(index))))
+
+        for suite in population:
+            self.testsExecuted += len(suite.getTests())
+            if os.path.exists(suite.getFileName()):
+                os.remove(suite.getFileName())
+
+        generation = 0
+        elapsedTime = time.time() - startTime
+        while elapsedTime < self.budget:
+            generation += 1
+            population.sort(key = lambda suite: suite.getScore())
+
+            # What is the best suite seen?
+            bestSuite = population[0]
+            print "Generation " + str(generation) + ":"
+            print "Best Score: " + str(bestSuite.getScore())
+            print bestSuite.getObligations()
+            print "Tests Executed: " + str(self.testsExecuted)
+            if self.generator.testCache != None:
+                print self.generator.testCache.getStatistics()
+            if self.generator.compileCache != None:
+                print self.generator.compileCache.getStatistics()
+            if self.testLimit > 0 or self.suiteLimit > 0:
+                print self.generator.timeouts.getStatistics()
+            if self.sharePrefixes == 1:
+                print self.generator.harness.getStatistics()
+
+            bestSuite.setFileName(self.getSuiteName("_best"))
+            bestSuite.writeSuiteFile()
+
+            if bestSuite.getScore() == 0:
+                break
+
+            # Elite suites survive unchanged
+            nextPopulation = population[:self.elites]
+            offspring = []
+            while len(nextPopulation) + len(offspring) < self.population:
+                parent1 = self.select(population)
+                parent2 = self.select(population)
+
+                if random.random() < self.crossoverRate:
+                    children = self.crossover(parent1, parent2)
+                else:
+                    children = [self.getGenes(parent1), self.getGenes(parent2)]
+
+                for genes in children:
+                    if len(nextPopulation) + len(offspring) >= self.population:
+                        break
+                    if random.random() < self.mutationRate:
+                        genes = self.mutate(genes)
+                    offspring.append(genes)
+
+            population = nextPopulation + self.evaluateOffspring(offspring)
+
+            # Calculate time
+            elapsedTime = time.time() - startTime
+            print "Elapsed Time: " + str(elapsedTime)
+
+        if self.generator.harness != None:
+            self.generator.harness.close()
+
+    # Tournament selection. Returns the best of a random sample of the population.
+    def select(self, population):
+        best = None
+        for entry in range(0, self.tournamentSize):
+            candidate = population[random.randint(0, len(population) - 1)]
+            if best == None or candidate.getScore() < best.getScore():
+                best = candidate
+        return best
+
+    # Get the genes of a suite - its tests paired with their scores
+    def getGenes(self, suite):
+        genes = []
+        tests = suite.getTests()
+        testObligations = suite.getTestObligations()
+        for testIndex in range(0, len(tests)):
+            if testObligations[testIndex] != None:
+                genes.append([tests[testIndex], testObligations[testIndex]])
+        return genes
+
+    # Single-point crossover. Both parents are cut at the same relative position, and the tails are swapped.
+    def crossover(self, parent1, parent2):
+        genes1 = self.getGenes(parent1)
+        genes2 = self.getGenes(parent2)
+        point = random.random()
+        cut1 = int(round(point * len(genes1)))
+        cut2 = int(round(point * len(genes2)))
+
+        offspring = [genes1[:cut1] + genes2[cut2:], genes2[:cut2] + genes1[cut1:]]
+        for index in range(0, len(offspring)):
+            if len(offspring[index]) > self.maxSuiteSize:
+                offspring[index] = offspring[index][:int(self.maxSuiteSize)]
+            elif len(offspring[index]) == 0:
+                offspring[index] = copy.copy(genes1)
+        return offspring
+
+    # Apply one mutation operator to the genes of a suite.
+    # Modified tests lose their scores, so they are executed when the suite is evaluated.
+    def mutate(self, genes):
+        genes = copy.copy(genes)
+        operator = random.randint(0, 3)
+
+        if operator == 0 and len(genes) < self.maxSuiteSize:
+            # Insert a new random test
+            test = self.generator.buildTest(self.generator.buildInputGenerator(), str(len(genes) + 1))
+            genes.insert(random.randint(0, len(genes)), [test, None])
+        elif operator == 1 and len(genes) > 1:
+            # Delete a test
+            del genes[random.randint(0, len(genes) - 1)]
+        elif operator == 2:
+            # Change a literal
+            candidates = []
+            for index in range(0, len(genes)):
+                if len(self.literals.getLiterals(genes[index][0])) > 0:
+                    candidates.append(index)
+            if len(candidates) > 0:
+                index = candidates[random.randint(0, len(candidates) - 1)]
+                genes[index] = [self.literals.mutateLiteral(genes[index][0]), None]
+        elif operator == 3:
+            # Append a step to a state-impacting test
+            candidates = []
+            for index in range(0, len(genes)):
+                if "resetStateVariables();" in genes[index][0]:
+                    candidates.append(index)
+            if len(candidates) > 0:
+                index = candidates[random.randint(0, len(candidates) - 1)]
+                genes[index] = [self.generator.appendStatefulStep(genes[index][0]), None]
+
+        return genes
+
+    # Build and score suites from their genes. Only tests without scores are executed.
+    # In batch mode, the new and modified tests of all offspring are compiled into a single executable.
+    # If prefixes are shared, the harness runs the new and modified tests of all offspring as one prefix trie.
+    def evaluateOffspring(self, offspring):
+        pending = []
+        testSets = []
+        outFiles = []
+        for index in range(0, len(offspring)):
+            tests = [gene[0] for gene in offspring[index] if gene[1] == None]
+            if len(tests) > 0:
+                pending.append(index)
+                testSets.append(tests)
+                outFiles.append(self.getSuiteName("_offspring" + str(index)))
+
+        # Execute the new and modified tests of each offspring together
+        if (self.batch == 1 or self.sharePrefixes == 1) and len(pending) > 0:
+            evaluated = self.generator.evaluateBatch(testSets, outFiles, self.getSuiteName("_batch"))
+        elif self.compileThreads > 0 and len(pending) > 0:
+            evaluated = Pipeline(self.generator, self.compileThreads, self.executeThreads).evaluate(testSets, outFiles)
+        else:
+            evaluated = [self.generator.evaluate(testSets[index], outFiles[index]) for index in range(0, len(pending))]
+
+        offspring = list(offspring)
+        for index in range(0, len(pending)):
+            self.testsExecuted += len(testSets[index])
+            if os.path.exists(outFiles[index]):
+                os.remove(outFiles[index])
+            offspring[pending[index]] = self.assignScores(offspring[pending[index]], evaluated[index])
+
+        return [self.buildOffspring(genes) for genes in offspring]
+
+    # Give genes without scores the scores of their tests in an evaluated suite. Genes whose tests failed are dropped.
+    # Tests are matched back by body, as verification renumbers the tests that remain after failing tests are removed.
+    def assignScores(self, genes, evaluated):
+        scores = {}
+        for testIndex in range(0, len(evaluated.getTests())):
+            if evaluated.getTestObligations()[testIndex] != None:
+                scores[self.getBody(evaluated.getTests()[testIndex])] = evaluated.getTestObligations()[testIndex]
+
+        kept = []
+        for gene in genes:
+            if gene[1] != None:
+                kept.append(gene)
+            elif self.getBody(gene[0]) in scores:
+                kept.append([gene[0], scores[self.getBody(gene[0])]])
+        return kept
+
+    # Build a suite from genes that all have scores. The suite is not executed.
+    def buildOffspring(self, genes):
+        outFile = self.getSuiteName("_offspring")
+        tests = []
+        testObligations = []
+        for gene in genes:
+            tests.append(gene[0])
+            testObligations.append(gene[1])
+
+        suite = self.generator.buildSuiteFromTests(tests, outFile)
+        suite.setTestObligations(testObligations)
+        if len(testObligations) > 0:
+            suite.mergeTestObligations(len(testObligations[0]))
+        else:
+            suite.setScore(1000000)
+        return suite
+
+    # Test code without its declaration, which carries the test number
+    def getBody(self, test):
+        return test[test.index("\n") + 1:]
+
+    # Build the filename of a suite from the suite basename
+    def getSuiteName(self, suffix):
+        if ".c" in self.outFile:
+            return self.outFile[:self.outFile.index(".c")] + suffix + ".c"
+        else:
+            return self.outFile + suffix + ".c"
+
+def main(argv):
+    search = GeneticSearch()
+    program = ""
+    outFile = ""
+    maxSuiteSize = 25.0
+    maxLength = 10.0
+    budget = 120
+    populationSize = 50
+    elites = 1
+    tournamentSize = 2
+    crossoverRate = 0.75
+    mutationRate = 0.8
+    seed = None
+    prebuild = 0
+    dataDriven = 0
+    forkServer = 0
+    cacheSize = 0
+    testLimit = 0
+    suiteLimit = 0
+    keepArtifacts = 0
+    compileCacheSize = 0
+    cacheProgramData = 0
+    batch = 0
+    compileThreads = 0
+    executeThreads = 2
+    sharePrefixes = 0
+
+    try:
+        opts, args = getopt.getopt(argv,"hp:o:l:m:b:n:e:k:x:u:s:cdft:w:W:aC:DBP:E:T")
+    except getopt.GetoptError:
+        print 'GeneticSearch.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size> -b <search budget> -n <population size> -e <elites> -k <tournament size> -x <crossover probability> -u <mutation probability> -s <random seed> -c -d -f -t <test cache size> -w <test time limit> -W <suite time limit> -a -C <compile cache size> -D -B -P <compile threads> -E <execute threads> -T'
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt == "-h":
+            print 'GeneticSearch.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size> -b <search budget> -n <population size> -e <elites> -k <tournament size> -x <crossover probability> -u <mutation probability> -s <random seed> -c -d -f -t <test cache size> -w <test time limit> -W <suite time limit> -a -C <compile cache size> -D -B -P <compile threads> -E <execute threads> -T'
+            sys.exit()
+        elif opt == "-p":
+            if arg == "":
+                raise Exception('No program specified')
+            else:
+                program = arg
+        elif opt == "-o":
+            outFile = arg
+        elif opt == "-l":
+            maxLength = float(arg)
+        elif opt == "-m":
+            maxSuiteSize = float(arg)
+        elif opt == "-b":
+            budget = int(arg)
+        elif opt == "-n":
+            populationSize = int(arg)
+        elif opt == "-e":
+            elites = int(arg)
+        elif opt == "-k":
+            tournamentSize = int(arg)
+        elif opt == "-x":
+            crossoverRate = float(arg)
+        elif opt == "-u":
+            mutationRate = float(arg)
+        elif opt == "-s":
+            seed = int(arg)
+        elif opt == "-c":
+            prebuild = 1
+        elif opt == "-d":
+            dataDriven = 1
+        elif opt == "-f":
+            forkServer = 1
+        elif opt == "-t":
+            cacheSize = int(arg)
+        elif opt == "-w":
+            testLimit = float(arg)
+        elif opt == "-W":
+            suiteLimit = float(arg)
+        elif opt == "-a":
+            keepArtifacts = 1
+        elif opt == "-C":
+            compileCacheSize = int(arg)
+        elif opt == "-D":
+            cacheProgramData = 1
+        elif opt == "-B":
+            batch = 1
+        elif opt == "-P":
+            compileThreads = int(arg)
+        elif opt == "-E":
+            executeThreads = int(arg)
+        elif opt == "-T":
+            sharePrefixes = 1
+
+    if program == "":
+        raise Exception('No program specified')
+    else:
+        if outFile == "":
+            outFile = program[:program.index(".c")]+"_suite"
+        search.budget = budget
+        search.population = populationSize
+        search.elites = elites
+        search.tournamentSize = tournamentSize
+        search.crossoverRate = crossoverRate
+        search.mutationRate = mutationRate
+        search.seed = seed
+        search.prebuild = prebuild
+        search.dataDriven = dataDriven
+        search.forkServer = forkServer
+        search.cacheSize = cacheSize
+        search.testLimit = testLimit
+        search.suiteLimit = suiteLimit
+        search.keepArtifacts = keepArtifacts
+        search.compileCacheSize = compileCacheSize
+        search.cacheProgramData = cacheProgramData
+        search.batch = batch
+        search.compileThreads = compileThreads
+        search.executeThreads = executeThreads
+        search.sharePrefixes = sharePrefixes
+        search.maxLength = maxLength
+        search.maxSuiteSize = maxSuiteSize
+        search.program = program
+        search.outFile = outFile
+        search.search()
+
+# Call into main
+if __name__ == '__main__':
+    main(sys.argv[1:])
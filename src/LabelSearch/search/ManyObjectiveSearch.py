@@ -0,0 +1,420 @@
+# Gregory Gay (greg@greggay.com)
+# Many-objective search, in the style of MOSA/DynaMOSA. Each label is a separate objective,
+# and individuals are single tests rather than suites.
+# An archive keeps the shortest test covering each label. Once a label is covered, it is no longer
+# targeted - selection only considers the distances to labels that remain uncovered.
+# For each uncovered label, the test closest to covering it is preferred (ties go to the shorter test).
+# Preferred tests survive into the next generation first, followed by the tests closest to any uncovered label.
+# When the budget runs out, the final suite is built from the archive.
+
+# Command line options:
+# -p <instrumented program>
+# -L <labels file, optional. If given, only the labels it lists are targeted, and coverage is reported per tag.>
+# -o <basename of test suite, default is (instrumented program)_suite.c>
+# -l <maximum single test length, default is 10 steps (assignments or calls)>
+# -b <search budget, default is 120 seconds>
+# -n <population size, default is 50>
+# -s <random seed, optional>
+# -c (compile the program once into an object file, and link suites against it)
+# -d (evaluate suites through a data-driven harness compiled once per program)
+# -f (run the data-driven harness as a fork-server, implies -d)
+# -t <number of executed tests to cache, default is 0 (no caching)>
+# -w <time limit on a single test, in seconds, default is 0 (no limit)>
+# -W <time limit on a whole suite, in seconds, default is 0 (no limit)>
+# -a (keep compile and run artifacts in their workspace directories, for debugging)
+# -C <number of compilations to cache on disk, default is 0 (no caching)>
+# -D (cache the parsed program data on disk, so later runs on the same program skip parsing)
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import getopt
+import sys
+import os
+import time
+import random
+from ..generation.Generator import Generator
+from ..generation.LiteralEditor import LiteralEditor
+from ..structures.TestCache import TestCache
+from ..generation.CompileCache import CompileCache
+from ..generation.ProgramDataCache import ProgramDataCache
+
+class ManyObjectiveSearch():
+
+    # Suite generator
+    generator = Generator()
+    # Program filename
+    program = ""
+    # Labels file. If set, only the labels it lists are targeted.
+    labelFile = ""
+    # Suite basename
+    outFile = ""
+    # Search budget
+    budget = 120
+    # Population
+    population = 50
+    # Max test length
+    maxLength = 10.0
+    # Random seed (None uses the system default)
+    seed = None
+    # If 1, the program is compiled once and suites are linked against the object file
+    prebuild = 0
+    # If 1, suites are evaluated through the data-driven harness where possible
+    dataDriven = 0
+    # If 1, the data-driven harness runs as a long-lived fork-server
+    forkServer = 0
+    # Maximum number of executed tests to cache. If 0, tests are not cached.
+    cacheSize = 0
+    # Seconds a single test may run. If 0, tests are not limited.
+    testLimit = 0
+    # Seconds a whole suite may run. If 0, suites are not limited.
+    suiteLimit = 0
+    # If 1, compile and run artifacts are kept for debugging
+    keepArtifacts = 0
+    # Maximum number of compilations to cache. If 0, compiler output is not cached.
+    compileCacheSize = 0
+    # If 1, parsed program data is cached on disk
+    cacheProgramData = 0
+    # Reads and replaces the literals in test code
+    literals = LiteralEditor()
+    # Tags of the targeted labels, keyed by label id
+    labelTags = {}
+    # Archive. For each covered label id, the shortest test covering it, as [test, scores].
+    archive = {}
+    # Label ids that remain uncovered
+    uncovered = []
+    # Number of tests executed so far
+    testsExecuted = 0
+
+    # Central search
+    def search(self):
+        random.seed(self.seed)
+
+        # Set up generator. Tests are built directly, so the program data is needed up front.
+        self.generator.setProgram(self.program)
+        self.generator.maxLength = self.maxLength
+        if self.compileCacheSize > 0:
+            self.generator.compileCache = CompileCache(maxSize = self.compileCacheSize)
+        if self.cacheProgramData == 1:
+            self.generator.programDataCache = ProgramDataCache()
+        self.generator.initializeProgramData()
+        if self.prebuild == 1:
+            self.generator.buildProgramObject()
+        if self.dataDriven == 1 or self.forkServer == 1:
+            self.generator.buildHarness()
+            self.generator.harness.forkServer = self.forkServer
+        if self.cacheSize > 0:
+            self.generator.testCache = TestCache(self.cacheSize)
+            self.generator.testCache.setProgram(self.program)
+        self.generator.timeouts.testLimit = self.testLimit
+        self.generator.timeouts.suiteLimit = self.suiteLimit
+        self.generator.workspace.keep = self.keepArtifacts
+        if self.labelFile != "":
+            self.readLabels()
+
+        startTime = time.time()
+        self.testsExecuted = 0
+        self.archive = {}
+        self.uncovered = []
+
+        # Initial population of random tests
+        inputGenerator = self.generator.buildInputGenerator()
+        tests = []
+        for index in range(0, self.population):
+            tests.append(self.generator.buildTest(inputGenerator, str(index + 1)))
+        population = self.evaluateTests(tests)
+
+        generation = 0
+        elapsedTime = time.time() - startTime
+        # Labels are only known once a test has run, so the search continues until then
+        while elapsedTime < self.budget and (len(self.archive) == 0 or len(self.uncovered) > 0):
+            generation += 1
+
+            if len(population) == 0:
+                # Every test failed. Start over from new random tests.
+                tests = []
+                for index in range(0, self.population):
+                    tests.append(self.generator.buildTest(inputGenerator, str(index + 1)))
+                population = self.evaluateTests(tests)
+                continue
+
+            # Create offspring through mutation of tests chosen by tournament
+            ranks = self.rank(population)
+            offspring = []
+            for index in range(0, self.population):
+                offspring.append(self.mutate(self.select(population, ranks)[0]))
+            offspring = self.evaluateTests(offspring)
+
+            # Survivors are chosen with respect to the labels that remain uncovered
+            combined = population + offspring
+            ranks = self.rank(combined)
+            order = sorted(range(0, len(combined)), key = lambda index: ranks[index])
+            population = []
+            for index in order[:self.population]:
+                population.append(combined[index])
+
+            print "Generation " + str(generation) + ":"
+            print "Covered Labels: " + str(len(self.archive)) + " / " + str(len(self.archive) + len(self.uncovered))
+            print "Tests Executed: " + str(self.testsExecuted)
+            if self.generator.testCache != None:
+                print self.generator.testCache.getStatistics()
+            if self.generator.compileCache != None:
+                print self.generator.compileCache.getStatistics()
+            if self.testLimit > 0 or self.suiteLimit > 0:
+                print self.generator.timeouts.getStatistics()
+
+            # Calculate time
+            elapsedTime = time.time() - startTime
+            print "Elapsed Time: " + str(elapsedTime)
+
+        suite = self.buildArchiveSuite()
+        print "Final Suite: " + str(len(suite.getTests())) + " tests"
+        print "Score: " + str(suite.getScore())
+        self.printCoverage()
+
+        if self.generator.harness != None:
+            self.generator.harness.close()
+
+    # Read the label ids and tags from the labels file
+    def readLabels(self):
+        self.labelTags = {}
+        labels = open(self.labelFile, "r")
+        for line in labels:
+            if line.startswith("#") or line.strip() == "":
+                continue
+            words = line.split(",")
+            self.labelTags[int(words[0])] = words[2].strip()
+        labels.close()
+
+    # Execute tests, update the archive, and return the executed tests as [test, scores] pairs.
+    # Tests that fail are dropped.
+    def evaluateTests(self, tests):
+        outFile = self.getSuiteName("_population")
+        suite = self.generator.evaluate(tests, outFile)
+        self.testsExecuted += len(tests)
+        if os.path.exists(outFile):
+            os.remove(outFile)
+
+        evaluated = []
+        for testIndex in range(0, len(suite.getTests())):
+            if suite.getTestObligations()[testIndex] != None:
+                evaluated.append([suite.getTests()[testIndex], suite.getTestObligations()[testIndex]])
+
+        if self.archive == {} and self.uncovered == [] and len(evaluated) > 0:
+            # First evaluation - every targeted label starts uncovered
+            for label in range(1, len(evaluated[0][1]) + 1):
+                if self.labelTags == {} or label in self.labelTags:
+                    self.uncovered.append(label)
+
+        self.updateArchive(evaluated)
+        return evaluated
+
+    # Add tests covering labels to the archive. A covered label keeps the shortest test that covers it.
+    def updateArchive(self, evaluated):
+        for individual in evaluated:
+            for label in self.uncovered + self.archive.keys():
+                if individual[1][label - 1] <= 0:
+                    if label not in self.archive or self.getLength(individual[0]) < self.getLength(self.archive[label][0]):
+                        self.archive[label] = individual
+
+        remaining = []
+        for label in self.uncovered:
+            if label not in self.archive:
+                remaining.append(label)
+        self.uncovered = remaining
+
+    # Rank individuals by the uncovered labels. Returns a sortable rank for each individual.
+    # Preferred individuals - closest to some uncovered label - come first. The rest are ordered by
+    # their distance to the uncovered label they are closest to. Shorter tests break ties.
+    def rank(self, individuals):
+        preferred = set()
+        for label in self.uncovered:
+            best = -1
+            for index in range(0, len(individuals)):
+                if best == -1 or self.isCloser(individuals[index], individuals[best], label):
+                    best = index
+            if best != -1:
+                preferred.add(best)
+
+        ranks = []
+        for index in range(0, len(individuals)):
+            closest = 1000000.0
+            for label in self.uncovered:
+                if individuals[index][1][label - 1] < closest:
+                    closest = individuals[index][1][label - 1]
+
+            # Length only matters once an uncovered label is reached. Otherwise, shorter tests would be
+            # favoured even though they are no closer to reaching any label.
+            length = 0
+            if closest < 1000000.0:
+                length = self.getLength(individuals[index][0])
+
+            if index in preferred:
+                ranks.append((0, closest, length))
+            else:
+                ranks.append((1, closest, length))
+        return ranks
+
+    # Is the first individual closer to covering the label than the second?
+    def isCloser(self, first, second, label):
+        if first[1][label - 1] != second[1][label - 1]:
+            return first[1][label - 1] < second[1][label - 1]
+        return first[1][label - 1] < 1000000.0 and self.getLength(first[0]) < self.getLength(second[0])
+
+    # Binary tournament selection on rank
+    def select(self, individuals, ranks):
+        first = random.randint(0, len(individuals) - 1)
+        second = random.randint(0, len(individuals) - 1)
+        if ranks[second] < ranks[first]:
+            return individuals[second]
+        return individuals[first]
+
+    # Mutate a test by changing a literal or appending a step. Occasionally, the test is replaced with a new random test.
+    def mutate(self, test):
+        chance = random.random()
+        if chance < 0.1:
+            return self.generator.buildTest(self.generator.buildInputGenerator(), "1")
+        elif chance < 0.4 and "resetStateVariables();" in test:
+            return self.generator.appendStatefulStep(test)
+        elif len(self.literals.getLiterals(test)) > 0:
+            return self.literals.mutateLiteral(test)
+        elif "resetStateVariables();" in test:
+            return self.generator.appendStatefulStep(test)
+        return self.generator.buildTest(self.generator.buildInputGenerator(), "1")
+
+    # Length of a test, in lines of code
+    def getLength(self, test):
+        return len(test.strip().split("\n"))
+
+    # Build the final suite from the archive, and write it to a file.
+    # Tests covering several labels are only included once.
+    def buildArchiveSuite(self):
+        tests = []
+        testObligations = []
+        for label in sorted(self.archive.keys()):
+            if self.archive[label][0] not in tests:
+                tests.append(self.archive[label][0])
+                testObligations.append(self.archive[label][1])
+
+        suite = self.generator.buildSuiteFromTests(tests, self.getSuiteName("_best"))
+        suite.setTestObligations(testObligations)
+        if len(testObligations) > 0:
+            suite.mergeTestObligations(len(testObligations[0]))
+        suite.writeSuiteFile()
+        return suite
+
+    # Print the number of covered labels, per tag if tags are known
+    def printCoverage(self):
+        if self.labelTags == {}:
+            print "Covered Labels: " + str(len(self.archive)) + " / " + str(len(self.archive) + len(self.uncovered))
+            return
+
+        for tag in sorted(set(self.labelTags.values())):
+            covered = 0
+            total = 0
+            for label in self.labelTags:
+                if self.labelTags[label] == tag:
+                    total += 1
+                    if label in self.archive:
+                        covered += 1
+            print "Covered " + tag + " Labels: " + str(covered) + " / " + str(total)
+
+    # Build the filename of a suite from the suite basename
+    def getSuiteName(self, suffix):
+        if ".c" in self.outFile:
+            return self.outFile[:self.outFile.index(".c")] + suffix + ".c"
+        else:
+            return self.outFile + suffix + ".c"
+
+def main(argv):
+    search = ManyObjectiveSearch()
+    program = ""
+    labelFile = ""
+    outFile = ""
+    maxLength = 10.0
+    budget = 120
+    populationSize = 50
+    seed = None
+    prebuild = 0
+    dataDriven = 0
+    forkServer = 0
+    cacheSize = 0
+    testLimit = 0
+    suiteLimit = 0
+    keepArtifacts = 0
+    compileCacheSize = 0
+    cacheProgramData = 0
+
+    try:
+        opts, args = getopt.getopt(argv,"hp:L:o:l:b:n:s:cdft:w:W:aC:D")
+    except getopt.GetoptError:
+        print 'ManyObjectiveSearch.py -p <program name> -L <labels file> -o <output filename> -l <max individual test length> -b <search budget> -n <population size> -s <random seed> -c -d -f -t <test cache size> -w <test time limit> -W <suite time limit> -a -C <compile cache size> -D'
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt == "-h":
+            print 'ManyObjectiveSearch.py -p <program name> -L <labels file> -o <output filename> -l <max individual test length> -b <search budget> -n <population size> -s <random seed> -c -d -f -t <test cache size> -w <test time limit> -W <suite time limit> -a -C <compile cache size> -D'
+            sys.exit()
+        elif opt == "-p":
+            if arg == "":
+                raise Exception('No program specified')
+            else:
+                program = arg
+        elif opt == "-L":
+            labelFile = arg
+        elif opt == "-o":
+            outFile = arg
+        elif opt == "-l":
+            maxLength = float(arg)
+        elif opt == "-b":
+            budget = int(arg)
+        elif opt == "-n":
+            populationSize = int(arg)
+        elif opt == "-s":
+            seed = int(arg)
+        elif opt == "-c":
+            prebuild = 1
+        elif opt == "-d":
+            dataDriven = 1
+        elif opt == "-f":
+            forkServer = 1
+        elif opt == "-t":
+            cacheSize = int(arg)
+        elif opt == "-w":
+            testLimit = float(arg)
+        elif opt == "-W":
+            suiteLimit = float(arg)
+        elif opt == "-a":
+            keepArtifacts = 1
+        elif opt == "-C":
+            compileCacheSize = int(arg)
+        elif opt == "-D":
+            cacheProgramData = 1
+
+    if program == "":
+        raise Exception('No program specified')
+    else:
+        if outFile == "":
+            outFile = program[:program.index(".c")]+"_suite"
+        search.budget = budget
+        search.population = populationSize
+        search.seed = seed
+        search.prebuild = prebuild
+        search.dataDriven = dataDriven
+        search.forkServer = forkServer
+        search.cacheSize = cacheSize
+        search.testLimit = testLimit
+        search.suiteLimit = suiteLimit
+        search.keepArtifacts = keepArtifacts
+        search.compileCacheSize = compileCacheSize
+        search.cacheProgramData = cacheProgramData
+        search.maxLength = maxLength
+        search.program = program
+        search.labelFile = labelFile
+        search.outFile = outFile
+        search.search()
+
+# Call into main
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -9,6 +9,21 @@
 # -m <maximum test suite size, default is 25>
 # -b <search budget, default is 120 seconds>
 # -n <population size, default is 100>
+# -j <number of worker processes used to evaluate the population, default is 1>
+# -s <random seed, optional>
+# -c (compile the program once into an object file, and link suites against it)
+# -d (evaluate suites through a data-driven harness compiled once per program)
+# -f (run the data-driven harness as a fork-server, implies -d)
+# -t <number of executed tests to cache, default is 0 (no caching)>
+# -w <time limit on a single test, in seconds, default is 0 (no limit)>
+# -W <time limit on a whole suite, in seconds, default is 0 (no limit)>
+# -a (keep compile and run artifacts in their workspace directories, for debugging)
+# -C <number of compilations to cache on disk, default is 0 (no caching)>
+# -D (cache the parsed program data on disk, so later runs on the same program skip parsing)
+# -B (compile the suites of each generation into a single executable)
+# -P <number of threads compiling suites in the evaluation pipeline, default is 0 (no pipeline)>
+# -E <number of threads executing suites in the evaluation pipeline, default is 2>
+# -T (run the tests of each generation through the harness as one prefix trie, executing shared first steps once, implies -d and -B)
 
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
@@ -19,10 +34,45 @@ import getopt
 import sys
 import os
 import time
-import re
+import random
+import multiprocessing
 from subprocess import Popen, call, PIPE, STDOUT
 from ..generation.Generator import Generator
 from ..structures.TestSuite import TestSuite
+from ..structures.TestCache import TestCache
+from ..generation.CompileCache import CompileCache
+from ..generation.ProgramDataCache import ProgramDataCache
+from ..generation.Pipeline import Pipeline
+
+# Generator used by a worker process. Set once per worker by initializeWorker.
+workerGenerator = None
+
+# Sets up a worker process for parallel evaluation.
+# Workers share nothing on disk but the suite files, as every evaluation compiles and runs in its own workspace.
+def initializeWorker(generator):
+    global workerGenerator
+    workerGenerator = generator
+
+# Generates, verifies, and scores a single suite in a worker process.
+# Each task carries its own seed, so results do not depend on which worker picks it up.
+# Each worker keeps its own test cache, so the cache hits and misses of the task are returned with the suite.
+# Workers share the compile cache on disk, but count its hits and misses separately, so these are returned as well.
+def generateSuite(task):
+    (suiteName, seed) = task
+    random.seed(seed)
+    counts = [0, 0, 0, 0]
+    caches = [workerGenerator.testCache, workerGenerator.compileCache]
+    for index in range(0, len(caches)):
+        if caches[index] != None:
+            counts[index * 2] -= caches[index].hits
+            counts[index * 2 + 1] -= caches[index].misses
+
+    suite = workerGenerator.generate(suiteName)
+    for index in range(0, len(caches)):
+        if caches[index] != None:
+            counts[index * 2] += caches[index].hits
+            counts[index * 2 + 1] += caches[index].misses
+    return (suite, counts[0], counts[1], counts[2], counts[3])
 
 class RandomSearch(): 
 
@@ -40,14 +90,83 @@ class RandomSearch():
     maxSuiteSize = 25.0
     # Max test length
     maxLength = 10.0
-
+    # Number of worker processes used to evaluate the population
+    workers = 1
+    # Random seed (None uses the system default)
+    seed = None
+    # If 1, the program is compiled once and suites are linked against the object file
+    prebuild = 0
+    # If 1, suites are evaluated through the data-driven harness where possible
+    dataDriven = 0
+    # If 1, the data-driven harness runs as a long-lived fork-server
+    forkServer = 0
+    # Maximum number of executed tests to cache. If 0, tests are not cached.
+    cacheSize = 0
+    # Seconds a single test may run. If 0, tests are not limited.
+    testLimit = 0
+    # Seconds a whole suite may run. If 0, suites are not limited.
+    suiteLimit = 0
+    # If 1, compile and run artifacts are kept for debugging
+    keepArtifacts = 0
+    # Maximum number of compilations to cache. If 0, compiler output is not cached.
+    compileCacheSize = 0
+    # If 1, parsed program data is cached on disk
+    cacheProgramData = 0
+    # If 1, the suites of a generation are compiled into a single executable
+    batch = 0
+    # Threads per stage of the evaluation pipeline. If compileThreads is 0, suites are evaluated one at a time.
+    compileThreads = 0
+    executeThreads = 2
+    # If 1, the tests of a generation are run through the harness as a prefix trie, sharing the steps that start several tests
+    sharePrefixes = 0
 
     # Central search
     def search(self):
+        random.seed(self.seed)
+        # Seeds of the suites are drawn from their own generator. Suites reseed the global one while they are built,
+        # so serial and parallel runs draw the same seeds in every generation.
+        seeds = random.Random(self.seed)
+        pool = None
+
+        if self.workers > 1:
+            # Paths are made absolute, so workers do not depend on the directory they run in.
+            self.program = os.path.abspath(self.program)
+            self.outFile = os.path.abspath(self.outFile)
+
         # Set up generator
         self.generator.setProgram(self.program)
         self.generator.maxLength = self.maxLength
         self.generator.maxSuiteSize = self.maxSuiteSize
+        if self.compileCacheSize > 0:
+            self.generator.compileCache = CompileCache(maxSize = self.compileCacheSize)
+        if self.cacheProgramData == 1:
+            self.generator.programDataCache = ProgramDataCache()
+        if self.prebuild == 1:
+            self.generator.buildProgramObject()
+        if self.dataDriven == 1 or self.forkServer == 1 or self.sharePrefixes == 1:
+            self.generator.buildHarness()
+            self.generator.harness.forkServer = self.forkServer
+            self.generator.harness.sharePrefixes = self.sharePrefixes
+        if self.cacheSize > 0:
+            self.generator.testCache = TestCache(self.cacheSize)
+            self.generator.testCache.setProgram(self.program)
+        self.generator.timeouts.testLimit = self.testLimit
+        self.generator.timeouts.suiteLimit = self.suiteLimit
+        self.generator.workspace.keep = self.keepArtifacts
+        cacheHits = 0
+        cacheMisses = 0
+
+        if self.workers > 1:
+            # Parse the program once, before forking, so workers inherit the program data.
+            # The harness may have parsed it already.
+            if self.generator.getFunctions()==[] or self.generator.getStateVariables()==[] or self.generator.getDependencyMap()==[]:
+                self.generator.initializeProgramData()
+            pool = multiprocessing.Pool(self.workers, initializeWorker, (self.generator,))
+        elif self.batch == 1 or self.sharePrefixes == 1:
+            # Tests are built before any suite is evaluated, so the program data is needed up front.
+            # The harness may have parsed it already.
+            if self.generator.getFunctions()==[] or self.generator.getStateVariables()==[] or self.generator.getDependencyMap()==[]:
+                self.generator.initializeProgramData()
         
         bestScore = 1000000
         bestSuite = TestSuite()
@@ -57,15 +176,38 @@ class RandomSearch():
         elapsedTime = 0
         while elapsedTime < self.budget:
             generation += 1
-            # Generate test suites
-            suites = []
+            # Seeds are drawn up front so that serial and parallel runs produce the same suites.
+            tasks = []
             for index in range(0,self.population):
-                if ".c" in self.outFile:
-                    suiteName = self.outFile[:self.outFile.index(".c")] + str(index) + ".c"
-                else:
-                    suiteName = self.outFile + str(index) + ".c"
+                tasks.append((self.getSuiteName(str(index)), seeds.randint(0, sys.maxint)))
+
+            # Generate test suites
+            if pool != None:
+                suites = []
+                for (suite, hits, misses, compileHits, compileMisses) in pool.map(generateSuite, tasks):
+                    suites.append(suite)
+                    cacheHits += hits
+                    cacheMisses += misses
+                    if self.generator.compileCache != None:
+                        self.generator.compileCache.hits += compileHits
+                        self.generator.compileCache.misses += compileMisses
+            elif self.batch == 1 or self.sharePrefixes == 1:
+                # The tests of every suite are generated first, then the generation is compiled as a single executable
+                testSets = []
+                for task in tasks:
+                    random.seed(task[1])
+                    testSets.append(self.generator.buildSuite())
+                suites = self.generator.evaluateBatch(testSets, [task[0] for task in tasks], self.getSuiteName("_batch"))
+            elif self.compileThreads > 0:
+                pipeline = Pipeline(self.generator, self.compileThreads, self.executeThreads)
+                suites = pipeline.generate([task[0] for task in tasks], [task[1] for task in tasks])
+            else:
+                suites = []
+                for task in tasks:
+                    random.seed(task[1])
+                    suites.append(self.generator.generate(task[0]))
 
-                suites.append(self.generator.generate(suiteName))            
+            for index in range(0,self.population):
                 # Are they better than what has been seed to date?
                 if suites[index].getScore() < bestScore:
                     bestSuite = copy.deepcopy(suites[index])
@@ -75,23 +217,42 @@ class RandomSearch():
             print "Generation " + str(generation) + ":"
             print "Best Score: " + str(bestScore)
             print bestSuite.getObligations()
+            if self.generator.testCache != None:
+                if pool == None:
+                    print self.generator.testCache.getStatistics()
+                else:
+                    print "Test cache: " + str(cacheHits) + " hits, " + str(cacheMisses) + " misses, across " + str(self.workers) + " worker caches"
+            if self.generator.compileCache != None:
+                print self.generator.compileCache.getStatistics()
+            if self.testLimit > 0 or self.suiteLimit > 0:
+                print self.generator.timeouts.getStatistics()
+            if self.sharePrefixes == 1:
+                print self.generator.harness.getStatistics()
 
             # Clean up suites we aren't keeping
-            suiteName = bestSuite.getFileName()
-            newName = re.sub("\d+", "_best",suiteName)
-            bestSuite.setFileName(newName)
+            bestSuite.setFileName(self.getSuiteName("_best"))
             bestSuite.writeSuiteFile()
 
-            for index in range(0, self.population):
-                suiteName = suites[index].getFileName()
-                rmProcess = Popen("rm " + suiteName, stdout = PIPE, stderr = PIPE, shell = True)
-                (rOutput, eError) = rmProcess.communicate()
+            self.generator.workspace.removeFiles([suite.getFileName() for suite in suites])
 
             # Calculate time
             currentTime = time.time()
             elapsedTime = currentTime - startTime
             print "Elapsed Time: " + str(elapsedTime)
 
+        if pool != None:
+            pool.close()
+            pool.join()
+        if self.generator.harness != None:
+            self.generator.harness.close()
+
+    # Build the filename of a suite from the suite basename
+    def getSuiteName(self, suffix):
+        if ".c" in self.outFile:
+            return self.outFile[:self.outFile.index(".c")] + suffix + ".c"
+        else:
+            return self.outFile + suffix + ".c"
+
 def main(argv):
     search = RandomSearch()
     program = ""
@@ -100,16 +261,31 @@ def main(argv):
     maxLength = 10.0
     budget = 120
     populationSize = 100
+    workers = 1
+    seed = None
+    prebuild = 0
+    dataDriven = 0
+    forkServer = 0
+    cacheSize = 0
+    testLimit = 0
+    suiteLimit = 0
+    keepArtifacts = 0
+    compileCacheSize = 0
+    cacheProgramData = 0
+    batch = 0
+    compileThreads = 0
+    executeThreads = 2
+    sharePrefixes = 0
 
     try:
-        opts, args = getopt.getopt(argv,"hp:o:l:m:b:n:")
+        opts, args = getopt.getopt(argv,"hp:o:l:m:b:n:j:s:cdft:w:W:aC:DBP:E:T")
     except getopt.GetoptError:
-        print 'RandomSearch.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size> -b <search budget> -n <population size>'
+        print 'RandomSearch.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size> -b <search budget> -n <population size> -j <worker processes> -s <random seed> -c -d -f -t <test cache size> -w <test time limit> -W <suite time limit> -a -C <compile cache size> -D -B -P <compile threads> -E <execute threads> -T'
       	sys.exit(2)
   		
     for opt, arg in opts:
         if opt == "-h":
-            print 'RandomSearch.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size> -b <search budget> -n <population size>'
+            print 'RandomSearch.py -p <program name> -o <output filename> -l <max individual test length> -m <max suite size> -b <search budget> -n <population size> -j <worker processes> -s <random seed> -c -d -f -t <test cache size> -w <test time limit> -W <suite time limit> -a -C <compile cache size> -D -B -P <compile threads> -E <execute threads> -T'
             sys.exit()
       	elif opt == "-p":
             if arg == "":
@@ -124,8 +300,38 @@ def main(argv):
             maxSuiteSize = float(arg)
         elif opt == "-b":
             budget = int(arg)
-        elif opt == "-p":
+        elif opt == "-n":
             populationSize = int(arg)
+        elif opt == "-j":
+            workers = int(arg)
+        elif opt == "-s":
+            seed = int(arg)
+        elif opt == "-c":
+            prebuild = 1
+        elif opt == "-d":
+            dataDriven = 1
+        elif opt == "-f":
+            forkServer = 1
+        elif opt == "-t":
+            cacheSize = int(arg)
+        elif opt == "-w":
+            testLimit = float(arg)
+        elif opt == "-W":
+            suiteLimit = float(arg)
+        elif opt == "-a":
+            keepArtifacts = 1
+        elif opt == "-C":
+            compileCacheSize = int(arg)
+        elif opt == "-D":
+            cacheProgramData = 1
+        elif opt == "-B":
+            batch = 1
+        elif opt == "-P":
+            compileThreads = int(arg)
+        elif opt == "-E":
+            executeThreads = int(arg)
+        elif opt == "-T":
+            sharePrefixes = 1
 
     if program == "":
         raise Exception('No program specified')
@@ -134,6 +340,21 @@ def main(argv):
             outFile = program[:program.index(".c")]+"_suite"
         search.budget = budget
         search.population = populationSize
+        search.workers = workers
+        search.seed = seed
+        search.prebuild = prebuild
+        search.dataDriven = dataDriven
+        search.forkServer = forkServer
+        search.cacheSize = cacheSize
+        search.testLimit = testLimit
+        search.suiteLimit = suiteLimit
+        search.keepArtifacts = keepArtifacts
+        search.compileCacheSize = compileCacheSize
+        search.cacheProgramData = cacheProgramData
+        search.batch = batch
+        search.compileThreads = compileThreads
+        search.executeThreads = executeThreads
+        search.sharePrefixes = sharePrefixes
         search.maxLength = maxLength
         search.maxSuiteSize = maxSuiteSize
         search.program = program
@@ -0,0 +1,87 @@
+# Gregory Gay (greg@greggay.com)
+# Content-addressed cache of executed tests.
+# Maps a hash of the program and the normalized test body to the obligation scores
+# achieved by that test, so that identical tests do not need to be executed again.
+# Least-recently used entries are evicted once the cache reaches its maximum size.
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import sys
+import re
+import hashlib
+from collections import OrderedDict
+
+class TestCache():
+
+    # Cached obligation scores, ordered from least to most recently used
+    __entries = None
+    # Hash of the program under test. Scores are only valid for the program that produced them.
+    __programHash = ""
+    # Maximum number of cached tests
+    maxSize = 10000
+    # Number of lookups that found a cached test
+    hits = 0
+    # Number of lookups that did not
+    misses = 0
+    # Number of entries evicted to stay within the maximum size
+    evictions = 0
+
+    def __init__(self, maxSize = 10000):
+        self.__entries = OrderedDict()
+        self.maxSize = maxSize
+
+    # Set the program under test. Cached entries from a different program are discarded.
+    def setProgram(self, program):
+        source = open(program, "rb")
+        programHash = hashlib.sha1(source.read()).hexdigest()
+        source.close()
+
+        if programHash != self.__programHash:
+            self.__entries.clear()
+            self.__programHash = programHash
+
+    # Build the cache key for a test.
+    # The declaration line (and with it, the test number) is dropped and whitespace is collapsed,
+    # so the same test body maps to the same key wherever it appears in a suite.
+    def getKey(self, test):
+        body = test[test.index("\n") + 1:] if "\n" in test else ""
+        body = re.sub(r"\s+", " ", body).strip()
+        return hashlib.sha1(self.__programHash + "\n" + body).hexdigest()
+
+    # Get the cached obligation scores of a test. Returns None if the test is not cached.
+    def lookup(self, test):
+        key = self.getKey(test)
+        if key in self.__entries:
+            scores = self.__entries.pop(key)
+            self.__entries[key] = scores
+            self.hits += 1
+            return scores
+
+        self.misses += 1
+        return None
+
+    # Store the obligation scores achieved by a test
+    def store(self, test, scores):
+        key = self.getKey(test)
+        if key in self.__entries:
+            del self.__entries[key]
+        elif len(self.__entries) >= self.maxSize:
+            self.__entries.popitem(last = False)
+            self.evictions += 1
+
+        self.__entries[key] = scores
+
+    # Fraction of lookups that found a cached test
+    def getHitRate(self):
+        if self.hits + self.misses == 0:
+            return 0.0
+        return float(self.hits) / (self.hits + self.misses)
+
+    # Summary of cache use, for reporting
+    def getStatistics(self):
+        return "Test cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses (hit rate " + str(round(self.getHitRate() * 100, 1)) + "%), " + str(len(self.__entries)) + " cached, " + str(self.evictions) + " evicted"
+
+    def size(self):
+        return len(self.__entries)
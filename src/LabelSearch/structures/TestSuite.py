@@ -8,6 +8,7 @@
 
 import sys
 import os
+import array
 
 class TestSuite(): 
     # Overall suite structure. Contains place-markers for tests and the test list.
@@ -19,6 +20,9 @@ class TestSuite():
     __tests = []
     # Obligation scores
     __obligations = []
+    # Obligation scores achieved by each test alone, corresponds to entries in the test list.
+    # None if the test has not been executed.
+    __testObligations = []
     # Current score of the suite.
     __score = 1000000000
     # File name
@@ -89,7 +93,7 @@ class TestSuite():
                 for testNum in range(0,len(tests)):
                     where.write(tests[testNum])
             elif line == "//FILENAME":
-                out = "char* fileName = \"" + os.path.basename(self.getFileName()) + "sv\";\n"
+                out = "char* fileName = \"" + self.getScoreFileName() + "\";\n"
                 where.write(out)
             else:
                 where.write(line)
@@ -98,17 +102,73 @@ class TestSuite():
 
     # Import obligations from file and calculate the overall score
     def importObligations(self, fileName):
-        obFile = open(fileName, "r")
+        obFile = open(fileName, "rb")
+        data = obFile.read()
+        obFile.close()
+
+        # Suites written before scores were stored in binary print them as text
+        if data.startswith("# Obligation"):
+            self.parseObligations(data.split("\n"))
+        else:
+            self.readObligations(data)
+
+    # Read raw obligation scores and calculate the overall score.
+    # Scores are native floats: the number of obligations, followed by a row per executed test
+    # holding the test number and the scores achieved by that test.
+    def readObligations(self, data):
+        scores = array.array("f")
+        # A suite stopped part-way may also leave a partial float at the end, which is dropped
+        scores.fromstring(data[:len(data) - len(data) % scores.itemsize])
+
+        testObligations = [None] * len(self.getTests())
+        if len(scores) == 0:
+            # The suite was stopped before it wrote anything, so no tests ran
+            self.setTestObligations(testObligations)
+            if len(self.getObligations()) > 0:
+                self.mergeTestObligations()
+            else:
+                self.setScore(1000000000)
+            return
+
+        count = int(scores[0])
+        # A suite stopped part-way may leave an incomplete final row, which is ignored
+        for start in range(1, len(scores) - count, count + 1):
+            testObligations[int(scores[start]) - 1] = scores[start + 1:start + 1 + count]
+
+        self.setTestObligations(testObligations)
+        self.mergeTestObligations(count)
+
+    # Set the suite scores to the minimum scores across all enabled, executed tests, and calculate the overall score.
+    # Allows a suite to be scored without execution after tests are added, removed, or turned off.
+    def mergeTestObligations(self, count = -1):
+        if count == -1:
+            count = int(self.getObligations()[0])
+
+        obligations = array.array("f", [1000000.0] * (count + 1))
+        obligations[0] = count
+        testList = self.getTestList()
+        testObligations = self.getTestObligations()
+        for testIndex in range(0, len(testObligations)):
+            if testObligations[testIndex] != None and testList[testIndex] == 1:
+                row = testObligations[testIndex]
+                for obligation in range(0, count):
+                    if row[obligation] < obligations[obligation + 1]:
+                        obligations[obligation + 1] = row[obligation]
+
+        self.setObligations(obligations)
+        self.calculateScore()
+
+    # Parse obligation scores printed by the runner and calculate the overall score
+    def parseObligations(self, lines):
         obligations = []
-        for line in obFile:
+        for line in lines:
             if "# Obligation" in line:
                 obligations.append(0)
-            else:
+            elif line.strip() != "":
                 words = line.strip().split(",")
                 obligations.append(float(words[1]))
                 obligations[0] += 1
 
-        obFile.close()
         self.setObligations(obligations)
         self.calculateScore()
 
@@ -116,7 +176,7 @@ class TestSuite():
     def calculateScore(self):
         score = 0.0
         obligations = self.getObligations()
-        for testIndex in range(1,obligations[0]+1):
+        for testIndex in range(1,int(obligations[0])+1):
             if obligations[testIndex] == 1000000.0:
                 score += 1.0
             elif obligations[testIndex] > 0:
@@ -124,6 +184,17 @@ class TestSuite():
 
         self.setScore(score)
 
+    # Code that executes a test from the runner. Two lines - the check of the test list, and the call.
+    def getRunnerEntry(self, testNum):
+        return ["    if(tests[" + str(testNum) + "] == 1)\n", "        runTest(" + str(testNum) + ", test" + str(testNum) + ");\n"]
+
+    # Mask of enabled tests, one character per test, passed to the runner at execution time
+    def getTestMask(self):
+        mask = ""
+        for entry in self.getTestList():
+            mask = mask + str(entry)
+        return mask
+
     # Getters and setters
     def getTestList(self):
         return self.__testList
@@ -137,8 +208,15 @@ class TestSuite():
     def getFileName(self):
         return self.__fileName
 
+    # Name of the file the runner writes obligation scores to
+    def getScoreFileName(self):
+        return os.path.splitext(os.path.basename(self.getFileName()))[0] + ".obs"
+
     def getObligations(self):
         return self.__obligations
+
+    def getTestObligations(self):
+        return self.__testObligations
  
     def getScore(self):
         return self.__score
@@ -161,6 +239,9 @@ class TestSuite():
     def setObligations(self, obligations):
         self.__obligations = obligations
 
+    def setTestObligations(self, testObligations):
+        self.__testObligations = testObligations
+
     def setFileName(self, fileName):
         self.__fileName = fileName
 